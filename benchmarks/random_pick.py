@@ -0,0 +1,80 @@
+"""随机取行基准测试
+
+对比 `ORDER BY RANDOM() LIMIT 1` 与 rowid 索引随机取行（DatabaseManager 使用的方式）
+在不同数据量下的单次耗时。仅依赖标准库，可直接运行：
+
+    python benchmarks/random_pick.py [--rows 10000 100000 1000000] [--picks 200]
+"""
+import argparse
+import random
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+
+def build_table(path: Path, rows: int, holes: bool) -> None:
+    """创建测试数据表，holes为True时随机删除约10%的行制造rowid空洞"""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE jokes (id INTEGER PRIMARY KEY, content TEXT)")
+    conn.executemany(
+        "INSERT INTO jokes (content) VALUES (?)",
+        ((f"第{i}条笑话<br>  这是一段用于测试的内容  ",) for i in range(rows)),
+    )
+    if holes:
+        conn.execute("DELETE FROM jokes WHERE abs(random()) % 10 = 0")
+    conn.commit()
+    conn.close()
+
+
+def bench_order_by_random(conn: sqlite3.Connection, picks: int) -> float:
+    start = time.perf_counter()
+    for _ in range(picks):
+        conn.execute("SELECT content FROM jokes ORDER BY RANDOM() LIMIT 1").fetchone()
+    return (time.perf_counter() - start) / picks
+
+
+def bench_rowid_index(conn: sqlite3.Connection, picks: int):
+    # 与 RowidIndex.load 相同：连续时记录范围，否则加载rowid列表
+    start = time.perf_counter()
+    count, low, high = conn.execute(
+        "SELECT count(*), min(rowid), max(rowid) FROM jokes"
+    ).fetchone()
+    if high - low + 1 == count:
+        pick = lambda: random.randint(low, high)  # noqa: E731
+    else:
+        ids = [row[0] for row in conn.execute("SELECT rowid FROM jokes")]
+        pick = lambda: random.choice(ids)  # noqa: E731
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(picks):
+        conn.execute("SELECT content FROM jokes WHERE rowid = ?", (pick(),)).fetchone()
+    return load_time, (time.perf_counter() - start) / picks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--picks", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'holes':>6} {'ORDER BY RANDOM()':>18} {'rowid pick':>12} {'index load':>11} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            for holes in (False, True):
+                path = Path(tmp) / f"bench_{rows}_{int(holes)}.db"
+                build_table(path, rows, holes)
+                conn = sqlite3.connect(path)
+                baseline = bench_order_by_random(conn, args.picks)
+                load_time, indexed = bench_rowid_index(conn, args.picks)
+                conn.close()
+                print(
+                    f"{rows:>10} {str(holes):>6} {baseline * 1e3:>15.3f} ms"
+                    f" {indexed * 1e3:>9.3f} ms {load_time * 1e3:>8.1f} ms"
+                    f" {baseline / indexed:>7.0f}x"
+                )
+
+
+if __name__ == "__main__":
+    main()
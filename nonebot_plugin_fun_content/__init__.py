@@ -1,9 +1,15 @@
+import asyncio
+
 from nonebot import get_driver, logger
 from nonebot.plugin import PluginMetadata
 
+from .api import api
 from .config import plugin_config
+from .cooldown import cooldowns
 from .database import db_manager
 from .handlers import register_handlers
+from .prefetch import content_buffer
+from .router import bot_router
 from .scheduler import scheduler_instance
 from .utils import utils
 
@@ -42,6 +48,45 @@ driver = get_driver()
 # 插件初始化状态标志
 initialization_completed = False
 
+# 后台任务引用，防止任务被提前回收
+_background_tasks = set()
+
+
+def _run_in_background(coro):
+    """在后台运行协程，不阻塞启动流程"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def _warmup_database():
+    """后台预热数据库
+    - 检查数据库文件和数据表，加载随机行索引
+    - 预热成功后启动预处理内容缓存的后台检查和内容预取
+    """
+    try:
+        missing_tables = await db_manager.warmup()
+        if missing_tables:
+            logger.warning(f"数据库连接成功但缺少数据表: {', '.join(missing_tables)}")
+        else:
+            logger.success("数据库连接测试成功")
+    except FileNotFoundError:
+        logger.error(f"数据库文件未找到: {plugin_config.fun_content_db_path}")
+        logger.warning("插件将仅使用在线API功能")
+        return
+    except Exception as e:
+        logger.error(f"数据库初始化失败: {e}")
+        logger.warning("插件将仅使用在线API功能")
+        return
+
+    # 启动预处理内容缓存的后台检查
+    if db_manager.render_cache_refreshable and plugin_config.fun_content_random_index_refresh > 0:
+        scheduler_instance.start_render_cache_refresher(plugin_config.fun_content_random_index_refresh)
+
+    # 启动内容预取
+    content_buffer.start()
+
 @driver.on_startup
 async def plugin_init():
     """
@@ -54,30 +99,35 @@ async def plugin_init():
 
     logger.info("趣味内容插件正在初始化...")
 
-    # 检查数据库
+    # 在后台预热数据库，不阻塞机器人启动
+    _run_in_background(_warmup_database())
+
+    # 创建HTTP客户端
+    api.startup()
+
+    # 启动热搜榜后台轮询
+    if plugin_config.fun_content_hot_list_poll_interval > 0:
+        try:
+            scheduler_instance.start_hot_list_poller(plugin_config.fun_content_hot_list_poll_interval)
+        except Exception as e:
+            logger.error(f"热搜榜轮询启动失败: {e}")
+
+    # 定期输出运行统计
+    if plugin_config.fun_content_stats_log_interval > 0:
+        try:
+            scheduler_instance.start_stats_logger(plugin_config.fun_content_stats_log_interval)
+        except Exception as e:
+            logger.error(f"运行统计日志启动失败: {e}")
+
+    # 加载持久化数据（SQLite后端）
     try:
-        # 测试数据库连接和基本查询
-        test_content = await db_manager.get_random_content("hitokoto")
-        if test_content is None:
-            logger.warning("数据库连接成功但未能获取测试内容")
-        else:
-            logger.success("数据库连接测试成功")
-    except FileNotFoundError:
-        logger.error(f"数据库文件未找到: {plugin_config.fun_content_db_path}")
-        logger.warning("插件将仅使用在线API功能")
+        await utils.initialize()
     except Exception as e:
-        logger.error(f"数据库初始化失败: {e}")
-        logger.warning("插件将仅使用在线API功能")
+        logger.error(f"持久化数据加载失败: {e}")
 
     # 初始化定时任务
     try:
-        for group_id, group_tasks in utils.persistent_data["定时"].items():
-            for command, times in group_tasks.items():
-                for time in times:
-                    try:
-                        scheduler_instance.add_job(group_id, command, time)
-                    except Exception as e:
-                        logger.error(f"定时任务添加失败 - 群组: {group_id}, 命令: {command}, 时间: {time}: {str(e)}")
+        scheduler_instance.load(utils.persistent_data[utils.SCHEDULED_KEY])
         logger.success("定时任务初始化完成")
     except Exception as e:
         logger.error(f"定时任务初始化失败: {e}")
@@ -93,20 +143,17 @@ async def plugin_shutdown():
     """
     logger.info("趣味内容插件正在关闭...")
 
-    # 更新定时任务数据
+    # 停止内容预取并关闭数据库连接
+    await content_buffer.close()
+    await db_manager.close()
+
+    # 关闭HTTP客户端和冷却后端
+    await api.close()
+    await cooldowns.close()
+
+    # 写入尚未保存的开关和定时任务数据（变更已在修改时写入持久化存储）
     try:
-        utils.persistent_data["定时"] = {
-            group_id: {
-                command: times for command, times in group_tasks.items() if times
-            } for group_id, group_tasks in scheduler_instance.jobs.items()
-        }
-
-        # 移除空的群组数据
-        utils.persistent_data["定时"] = {
-            group_id: group_tasks for group_id, group_tasks in utils.persistent_data["定时"].items() if group_tasks
-        }
-
-        utils._save_persistent_data()
+        await utils.close()
         logger.success("定时任务数据已保存")
     except Exception as e:
         logger.error(f"定时任务数据保存失败: {e}")
@@ -120,7 +167,10 @@ register_handlers()
 @driver.on_bot_connect
 async def handle_connect(bot):
     logger.success(f"Bot {bot.self_id} 已连接")
+    # 在后台获取群列表，更新定时任务的消息路由
+    _run_in_background(bot_router.refresh(bot))
 
 @driver.on_bot_disconnect
 async def handle_disconnect(bot):
-    logger.warning(f"Bot {bot.self_id} 已断开连接")
\ No newline at end of file
+    logger.warning(f"Bot {bot.self_id} 已断开连接")
+    bot_router.remove_bot(bot.self_id)
\ No newline at end of file
@@ -1,21 +1,92 @@
+import asyncio
+import importlib.util
+from io import BytesIO
+from typing import Any, Dict, Optional
+
 import httpx
 
 from nonebot import logger
+from .cache import ByteLRUCache, SingleFlight, TTLCache
 from .config import plugin_config
 from .database import db_manager
+from .prefetch import content_buffer
 from .response_handler import response_handler
 
 
 class API:
+    # 未单独配置时使用的超时时间（秒）
+    DEFAULT_TIMEOUT = 10.0
+    # 允许的图片响应类型
+    IMAGE_CONTENT_TYPES = ("image/", "application/octet-stream")
+
     def __init__(self):
-        """初始化API客户端"""
-        # 创建异步HTTP客户端，设置超时和重定向策略
-        self.client = httpx.AsyncClient(timeout=10.0, follow_redirects=True)
+        """初始化API客户端
+        - HTTP客户端在启动时按端点分别创建，关闭时统一释放
+        """
+        # 端点 -> HTTP客户端；每个端点使用独立的连接池，慢接口不会占用其他端点的连接
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._http2: Optional[bool] = None
         # 注册不同API端点对应的响应处理器
         self.process_functions = {
             "weibo_hot": response_handler.process_hot_list,
             "douyin_hot": response_handler.process_hot_list,
         }
+        # 热搜榜处理结果缓存，并发的未命中请求合并为一次上游请求
+        self.hot_list_cache: TTLCache[str] = TTLCache(ttl=plugin_config.fun_content_hot_list_ttl)
+        self._hot_list_flight = SingleFlight()
+        self._hot_list_served_age: Dict[str, float] = {}  # 端点 -> 最近一次返回的缓存条目年龄
+        # CP图片缓存，按角色名称对缓存，并发的相同请求合并为一次上游请求
+        self.cp_cache = ByteLRUCache(
+            max_bytes=plugin_config.fun_content_cp_cache_max_bytes,
+            ttl=plugin_config.fun_content_cp_cache_ttl,
+            spill_dir=plugin_config.fun_content_cp_cache_dir,
+            max_disk_bytes=plugin_config.fun_content_cp_cache_max_disk_bytes,
+        )
+        self._cp_flight = SingleFlight()
+        # 后台轮询开启后，请求只读取最近一次成功的快照（即使已过期），由轮询负责刷新
+        self.hot_list_polling = False
+
+    def _http2_enabled(self) -> bool:
+        """是否启用HTTP/2（需要安装 h2，未安装时回退到HTTP/1.1）"""
+        if self._http2 is None:
+            self._http2 = plugin_config.fun_content_http2
+            if self._http2 and importlib.util.find_spec("h2") is None:
+                logger.warning("HTTP/2 is enabled but the 'h2' package is not installed, falling back to HTTP/1.1")
+                self._http2 = False
+        return self._http2
+
+    def _create_client(self, endpoint: str) -> httpx.AsyncClient:
+        """按配置为端点创建HTTP客户端
+        - 连接数上限、keep-alive 过期时间来自配置
+        - 端点可单独配置 connect/read/write/pool 超时，未配置的使用默认超时
+        """
+        timeout = httpx.Timeout(
+            self.DEFAULT_TIMEOUT,
+            **plugin_config.fun_content_api_timeouts.get(endpoint, {})
+        )
+        limits = httpx.Limits(
+            max_connections=plugin_config.fun_content_http_max_connections,
+            max_keepalive_connections=plugin_config.fun_content_http_max_keepalive,
+            keepalive_expiry=plugin_config.fun_content_http_keepalive_expiry,
+        )
+        return httpx.AsyncClient(
+            timeout=timeout,
+            limits=limits,
+            http2=self._http2_enabled(),
+            follow_redirects=True,
+        )
+
+    def _get_client(self, endpoint: str) -> httpx.AsyncClient:
+        """获取端点对应的HTTP客户端，尚未创建或已关闭时重新创建"""
+        client = self._clients.get(endpoint)
+        if client is None or client.is_closed:
+            client = self._clients[endpoint] = self._create_client(endpoint)
+        return client
+
+    def startup(self):
+        """为所有已配置的在线API端点创建HTTP客户端"""
+        for endpoint in plugin_config.fun_content_api_urls:
+            self._get_client(endpoint)
 
     async def get_content(self, endpoint):
         """获取指定API端点的内容
@@ -32,7 +103,13 @@ class API:
         # 特殊端点处理逻辑
         if endpoint == "cp":
             raise ValueError("CP命令需要使用get_cp_content方法并提供参数")
-        elif endpoint == "beauty_pic":
+
+        # 优先从预取缓冲区获取本地数据库内容
+        buffered = content_buffer.pop(endpoint)
+        if buffered:
+            return buffered
+
+        if endpoint == "beauty_pic":
             # 从数据库获取随机美女图片
             try:
                 result = await db_manager.get_random_beauty_pic()
@@ -53,7 +130,7 @@ class API:
                 # 获取神回复内容（问答形式）
                 result = await db_manager.get_random_shenhuifu()
                 if result:
-                    return f"问：{result['question']}\n答：{result['answer']}"
+                    return response_handler.format_shenhuifu(result)
             else:
                 # 获取其他随机内容
                 result = await db_manager.get_random_content(endpoint)
@@ -68,8 +145,60 @@ class API:
         # 未知端点处理
         raise ValueError(f"未知的API端点: {endpoint}")
 
+    async def get_contents(self, endpoint, count):
+        """批量获取指定端点的多条不同内容（用于定时任务向多个群组发送不同内容）
+
+        Args:
+            endpoint: API端点名称
+            count: 需要的条数
+
+        Returns:
+            内容字符串列表；在线API端点或数据表条数不足时，返回的条数可能少于count
+
+        Raises:
+            ValueError: 当端点无效或获取内容失败时
+        """
+        if count <= 1 or endpoint not in plugin_config.DATABASE_SUPPORTED_COMMANDS:
+            return [await self.get_content(endpoint)]
+
+        try:
+            if endpoint == "shenhuifu":
+                results = [
+                    response_handler.format_shenhuifu(item)
+                    for item in await db_manager.batch_get_random_shenhuifu(count)
+                ]
+            else:
+                results = (await db_manager.batch_get_random_content([endpoint], count)).get(endpoint, [])
+        except Exception as e:
+            error_msg = response_handler.format_error(e, endpoint)
+            logger.error(f"从数据库批量获取{endpoint}失败: {error_msg}")
+            results = []
+
+        return [item for item in results if item] or [await self.get_content(endpoint)]
+
     async def _get_online_content(self, endpoint):
         """从在线API获取内容（私有方法）
+        - 优先返回未过期的缓存；后台轮询开启时返回最近一次成功的快照，不论是否过期
+        - 没有可用缓存时，并发的相同请求共享同一次上游请求
+
+        Args:
+            endpoint: 在线API端点名称
+
+        Returns:
+            处理后的内容字符串
+        """
+        entry = self.hot_list_cache.get_entry(endpoint, allow_stale=self.hot_list_polling)
+        if entry:
+            content, age = entry
+            self._hot_list_served_age[endpoint] = age
+            return content
+
+        content = await self._hot_list_flight.do(endpoint, lambda: self._fetch_online_content(endpoint))
+        self._hot_list_served_age[endpoint] = 0.0
+        return content
+
+    async def _fetch_online_content(self, endpoint):
+        """请求在线API并缓存有效的处理结果
 
         Args:
             endpoint: 在线API端点名称
@@ -84,7 +213,7 @@ class API:
 
         try:
             logger.info(f"Sending request to {url}")
-            response = await self.client.get(url)
+            response = await self._get_client(endpoint).get(url)
             response.raise_for_status()  # 检查HTTP响应状态
             data = response.json()  # 解析JSON响应
             logger.success(f"Received response from {url}")
@@ -92,7 +221,10 @@ class API:
             # 使用注册的处理器处理响应数据
             process_func = self.process_functions.get(endpoint)
             if process_func:
-                return process_func(data, endpoint)
+                content = process_func(data, endpoint)
+                if response_handler.is_hot_list_valid(data):
+                    self.hot_list_cache.set(endpoint, content)
+                return content
             raise ValueError(f"未知的API端点: {endpoint}")
         except Exception as e:
             error_msg = response_handler.format_error(e, endpoint)
@@ -106,7 +238,7 @@ class API:
             args: 包含两个角色名称的字符串，用空格分隔
 
         Returns:
-            图片二进制数据
+            BytesIO: 图片数据缓冲区，可直接交给 MessageSegment.image
         """
         names = args.split()
         if len(names) < 2:
@@ -123,18 +255,93 @@ class API:
         if not url:
             raise ValueError("CP API配置错误")
 
+        # 相同角色名称对优先使用缓存（BytesIO 初始化时与缓存共享同一份数据，不产生拷贝）
+        key = self._cp_cache_key(names[0], names[1])
+        cached = await self.cp_cache.get(key)
+        if cached is not None:
+            return BytesIO(cached)
+
         try:
-            response = await self.client.get(url, params={"n1": names[0], "n2": names[1]})
-            response.raise_for_status()
-            return response.content  # 返回图片二进制数据
+            image_data = await self._cp_flight.do(key, lambda: self._fetch_cp_image(key, url, names[0], names[1]))
+            return BytesIO(image_data)
         except Exception as e:
             error_msg = response_handler.format_error(e, "cp")
             logger.error(error_msg)
             raise ValueError(error_msg)
 
+    @staticmethod
+    def _cp_cache_key(n1: str, n2: str) -> str:
+        """生成CP图片缓存键
+        - 使用与上游请求完全相同的角色名称，不做大小写归一化（上游可能对大小写返回不同的图片）
+        - 角色顺序有意义，不做排序
+        """
+        return f"{n1}\x00{n2}"
+
+    async def _fetch_cp_image(self, key: str, url: str, n1: str, n2: str) -> bytes:
+        """下载CP图片并写入缓存"""
+        buffer = await self._download_image("cp", url, params={"n1": n1, "n2": n2})
+        image_data = buffer.getvalue()
+        await self.cp_cache.set(key, image_data)
+        return image_data
+
+    async def _download_image(self, endpoint: str, url: str, params: Dict[str, str]) -> BytesIO:
+        """流式下载图片
+        - 先检查响应类型和声明的长度，不符合要求时不读取响应体
+        - 分块写入同一个缓冲区，超过大小上限立即中止，避免整张图片的多份拷贝
+
+        Args:
+            endpoint: API端点名称
+            url: 图片地址
+            params: 请求参数
+
+        Returns:
+            BytesIO: 指针位于开头的图片数据缓冲区
+        """
+        max_bytes = plugin_config.fun_content_image_max_bytes
+        async with self._get_client(endpoint).stream("GET", url, params=params) as response:
+            response.raise_for_status()
+
+            content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+            if content_type and not content_type.startswith(self.IMAGE_CONTENT_TYPES):
+                raise ValueError(f"接口返回的不是图片 ({content_type})")
+
+            content_length = response.headers.get("content-length")
+            if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+                raise ValueError("图片过大")
+
+            buffer = BytesIO()
+            async for chunk in response.aiter_bytes():
+                if buffer.tell() + len(chunk) > max_bytes:
+                    raise ValueError("图片过大")
+                buffer.write(chunk)
+
+        buffer.seek(0)
+        return buffer
+
+    async def refresh_hot_lists(self):
+        """刷新所有热搜榜快照（由后台轮询调用）
+        - 刷新失败时保留原有快照，只记录日志
+        """
+        async def refresh(endpoint):
+            try:
+                await self._hot_list_flight.do(endpoint, lambda: self._fetch_online_content(endpoint))
+            except Exception as e:
+                logger.warning(f"Hot list refresh failed for {endpoint}, keeping last snapshot: {e}")
+
+        await asyncio.gather(*(refresh(endpoint) for endpoint in self.process_functions))
+
+    def hot_list_stats(self) -> Dict[str, Any]:
+        """获取热搜榜缓存统计数据
+        Returns:
+            Dict[str, Any]: 命中、未命中次数，以及各端点最近一次返回内容的缓存年龄（秒）
+        """
+        return {**self.hot_list_cache.stats(), "served_age": dict(self._hot_list_served_age)}
+
     async def close(self):
-        """关闭HTTP客户端连接池"""
-        await self.client.aclose()
+        """关闭所有HTTP客户端连接池"""
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
 
 
 # API单例实例
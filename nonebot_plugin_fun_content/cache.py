@@ -0,0 +1,253 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """合并并发的相同请求
+    - 同一个键同时只会有一个请求在执行，其余调用者等待并共享同一结果（或异常）
+    - 单个调用者被取消不会影响共享的请求
+    """
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """执行请求，若相同键的请求正在进行则直接等待其结果
+        Args:
+            key: 请求的键
+            func: 无参数的协程函数，仅在没有进行中的请求时调用
+        Returns:
+            请求结果
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # 标记异常已被获取，避免所有调用者都被取消时产生警告
+
+
+class TTLCache(Generic[T]):
+    """带过期时间的缓存
+    - 条目超过 ttl 秒视为过期，但在被覆盖或淘汰前仍保留，可按需读取过期数据
+    - 条目数超过 maxsize 时淘汰最久未使用的条目
+    - 记录命中和未命中次数
+    """
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Tuple[float, T]]" = OrderedDict()  # 键 -> (写入时间, 值)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_entry(self, key: Hashable, allow_stale: bool = False) -> Optional[Tuple[T, float]]:
+        """获取缓存条目
+        Args:
+            key: 缓存键
+            allow_stale: 是否返回已过期的条目
+        Returns:
+            Optional[Tuple[T, float]]: (值, 条目年龄秒数)，未命中时返回None
+        """
+        entry = self._data.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry[0]
+            if allow_stale or age <= self.ttl:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1], age
+        self.misses += 1
+        return None
+
+    def get(self, key: Hashable, default: Optional[T] = None) -> Optional[T]:
+        """获取未过期的值"""
+        entry = self.get_entry(key)
+        return entry[0] if entry else default
+
+    def set(self, key: Hashable, value: T):
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计数据"""
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._data)}
+
+
+class ByteLRUCache:
+    """按字节数限制大小的LRU缓存（用于缓存图片等二进制数据）
+    - 内存中条目总字节数超过 max_bytes 时淘汰最久未使用的条目
+    - 配置了 spill_dir 时，被淘汰的条目写入磁盘目录，命中后再读回内存；磁盘总大小超过 max_disk_bytes 时删除最旧的文件
+    - 条目（包括磁盘文件）自首次写入起超过 ttl 秒即过期，转存到磁盘的文件以首次写入时间作为修改时间
+    - 磁盘读写在线程中进行，不阻塞事件循环
+    """
+    def __init__(self, max_bytes: int, ttl: float,
+                 spill_dir: Optional[Path] = None, max_disk_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.spill_dir = spill_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._data: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()  # 键 -> (写入时间, 数据)
+        self._size = 0  # 内存中条目的总字节数
+        self._disk_index: Optional["OrderedDict[str, int]"] = None  # 文件名 -> 字节数，按写入顺序排列
+        self._disk_size = 0
+        self._disk_lock = threading.Lock()  # 磁盘索引在工作线程中访问
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def _file_name(key: str) -> str:
+        return hashlib.sha1(key.encode("utf-8")).hexdigest() + ".bin"
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """获取缓存数据，依次查找内存和磁盘，未命中或已过期时返回None"""
+        entry = self._data.get(key)
+        if entry is not None:
+            if time.monotonic() - entry[0] <= self.ttl:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self._remove(key)
+
+        if self.spill_dir is not None:
+            entry = await asyncio.to_thread(self._read_disk, self._file_name(key))
+            if entry is not None:
+                value, age = entry
+                self.disk_hits += 1
+                evicted = self._store(key, value, stored_at=time.monotonic() - age)
+                if evicted:
+                    await asyncio.to_thread(self._write_disk, evicted)
+                return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: bytes):
+        """写入缓存数据，超过内存上限的条目转存到磁盘"""
+        if not self.enabled or len(value) > self.max_bytes:
+            return
+        evicted = self._store(key, value)
+        if self.spill_dir is not None and evicted:
+            await asyncio.to_thread(self._write_disk, evicted)
+
+    def _store(self, key: str, value: bytes,
+               stored_at: Optional[float] = None) -> List[Tuple[str, bytes, float]]:
+        """写入内存并返回被淘汰的 (文件名, 数据, 首次写入的时间戳) 列表"""
+        self._remove(key)
+        self._data[key] = (time.monotonic() if stored_at is None else stored_at, value)
+        self._size += len(value)
+
+        evicted = []
+        while self._size > self.max_bytes:
+            old_key, (stored_at, old_value) = self._data.popitem(last=False)
+            self._size -= len(old_value)
+            age = time.monotonic() - stored_at
+            if age <= self.ttl:
+                evicted.append((self._file_name(old_key), old_value, time.time() - age))
+        return evicted
+
+    def _remove(self, key: str):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[1])
+
+    def _load_disk_index(self):
+        """首次访问磁盘时扫描缓存目录，按修改时间建立索引"""
+        if self._disk_index is not None:
+            return
+        self.spill_dir.mkdir(parents=True, exist_ok=True)
+        files = sorted(
+            (path.stat().st_mtime, path.name, path.stat().st_size)
+            for path in self.spill_dir.glob("*.bin")
+        )
+        self._disk_index = OrderedDict((name, size) for _, name, size in files)
+        self._disk_size = sum(self._disk_index.values())
+
+    def _read_disk(self, name: str) -> Optional[Tuple[bytes, float]]:
+        """读取磁盘缓存，返回 (数据, 年龄秒数)"""
+        with self._disk_lock:
+            self._load_disk_index()
+            if name not in self._disk_index:
+                return None
+            path = self.spill_dir / name
+            try:
+                age = time.time() - path.stat().st_mtime
+                if age > self.ttl:
+                    self._delete_disk(name)
+                    return None
+                return path.read_bytes(), age
+            except OSError:
+                self._disk_size -= self._disk_index.pop(name, 0)
+                return None
+
+    def _write_disk(self, items: List[Tuple[str, bytes, float]]):
+        with self._disk_lock:
+            self._load_disk_index()
+            self._write_disk_locked(items)
+
+    def _write_disk_locked(self, items: List[Tuple[str, bytes, float]]):
+        for name, value, stored_at in items:
+            if len(value) > self.max_disk_bytes:
+                continue
+            path = self.spill_dir / name
+            tmp_path = path.with_suffix(".tmp")
+            try:
+                tmp_path.write_bytes(value)
+                os.utime(tmp_path, (stored_at, stored_at))  # 磁盘上的年龄从首次写入时算起
+                os.replace(tmp_path, path)
+            except OSError:
+                continue
+            self._disk_size += len(value) - self._disk_index.pop(name, 0)
+            self._disk_index[name] = len(value)
+
+        # 超过磁盘上限时删除最旧的文件
+        while self._disk_size > self.max_disk_bytes and self._disk_index:
+            self._delete_disk(next(iter(self._disk_index)))
+
+    def _delete_disk(self, name: str):
+        self._disk_size -= self._disk_index.pop(name, 0)
+        try:
+            (self.spill_dir / name).unlink()
+        except OSError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计数据"""
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "entries": len(self._data),
+            "bytes": self._size,
+            "disk_bytes": self._disk_size,
+        }
@@ -0,0 +1,81 @@
+from typing import Dict, List, Optional, Tuple, TypedDict
+
+
+class CommandConfig(TypedDict):
+    """命令配置的类型定义
+    Attributes:
+        aliases: 命令别名元组，包含(主别名, [其他别名列表])
+        allow_args: 是否允许命令带参数
+    """
+    aliases: tuple[str, list[str]]  # (主别名, [其他别名列表])
+    allow_args: bool  # 是否允许命令带参数
+
+# 定义命令及其别名配置
+COMMANDS: dict[str, CommandConfig] = {
+    "hitokoto": {"aliases": ("一言", []), "allow_args": False},
+    "twq": {"aliases": ("土味情话", ["情话", "土味"]), "allow_args": False},
+    "dog": {"aliases": ("舔狗日记", ["dog", "舔狗"]), "allow_args": False},
+    "renjian": {"aliases": ("人间凑数", []), "allow_args": False},
+    "weibo_hot": {"aliases": ("微博热搜", ["微博"]), "allow_args": False},
+    "douyin_hot": {"aliases": ("抖音热搜", ["抖音"]), "allow_args": False},
+    "aiqinggongyu": {"aliases": ("爱情公寓", []), "allow_args": False},
+    "beauty_pic": {"aliases": ("随机美女", ["美女"]), "allow_args": False},
+    "cp": {"aliases": ("cp", ["宇宙cp"]), "allow_args": True},
+    "shenhuifu": {"aliases": ("神回复", ["神评"]), "allow_args": False},
+    "joke": {"aliases": ("讲个笑话", ["笑话"]), "allow_args": False},
+}
+
+
+def _all_aliases(info: CommandConfig) -> List[str]:
+    main_alias, other_aliases = info["aliases"]
+    return [main_alias] + other_aliases
+
+
+# 别名索引（启动时构建一次）：小写别名 -> 命令
+ALIAS_INDEX: Dict[str, str] = {
+    alias.lower(): cmd for cmd, info in COMMANDS.items() for alias in _all_aliases(info)
+}
+
+# 命令 -> 主别名（用于回复消息中显示）
+MAIN_ALIASES: Dict[str, str] = {cmd: info["aliases"][0] for cmd, info in COMMANDS.items()}
+
+# 允许带参数的命令按前缀匹配：(小写别名, 命令)，按长度从长到短排列
+PREFIX_ALIASES: List[Tuple[str, str]] = sorted(
+    ((alias.lower(), cmd) for cmd, info in COMMANDS.items() if info["allow_args"] for alias in _all_aliases(info)),
+    key=lambda item: len(item[0]),
+    reverse=True,
+)
+
+# 前缀别名的首字符，首字符不在其中的输入无需逐个比较前缀
+_PREFIX_INITIALS = frozenset(alias[0] for alias, _ in PREFIX_ALIASES)
+
+
+def resolve_command(text: str) -> Optional[Tuple[str, int]]:
+    """将用户输入解析为命令
+    - 输入与任一别名完全一致（不区分大小写）时直接命中
+    - 否则检查是否以允许带参数的命令别名开头
+    Args:
+        text: 去掉命令前缀后的用户输入
+    Returns:
+        Optional[Tuple[str, int]]: (命令, 匹配到的别名长度)，不是命令时返回None
+    """
+    key = text.lower()
+    command = ALIAS_INDEX.get(key)
+    if command is not None:
+        return command, len(key)
+
+    if key[:1] in _PREFIX_INITIALS:
+        for alias, command in PREFIX_ALIASES:
+            if key.startswith(alias):
+                return command, len(alias)
+    return None
+
+
+def find_command(alias: str) -> Optional[str]:
+    """按别名查找命令（用于管理和定时任务命令的参数）
+    Args:
+        alias: 命令别名，不区分大小写
+    Returns:
+        Optional[str]: 命令名称，未找到时返回None
+    """
+    return ALIAS_INDEX.get(alias.strip().lower())
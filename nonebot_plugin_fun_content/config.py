@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Literal, Optional
 
 from nonebot import get_driver
 from pydantic import BaseModel, Field
@@ -11,6 +11,87 @@ class Config(BaseModel):
         env="FUN_CONTENT_DB_PATH"
     )
 
+    # 内容存储后端：sqlite 为连接池查询，memory 为启动时将内容全部读入内存
+    fun_content_db_backend: Literal["sqlite", "memory"] = Field(
+        default="sqlite",
+        env="FUN_CONTENT_DB_BACKEND"
+    )
+
+    # 预处理内容缓存路径（仅sqlite后端）：启动时将需要处理换行的数据表处理后写入该文件，
+    # 请求时直接返回处理好的文本；按内容哈希判断是否需要重建，运行期间按随机行索引的刷新间隔在后台检查
+    # 数据库文件是否变化，变化时重建；为空时关闭，每次请求时处理
+    fun_content_db_render_cache: Optional[Path] = Field(
+        default=Path("config") / "fun_content_rendered.db",
+        env="FUN_CONTENT_DB_RENDER_CACHE"
+    )
+
+    # 连接池常驻连接数
+    fun_content_db_pool_size: int = Field(
+        default=5,
+        env="FUN_CONTENT_DB_POOL_SIZE"
+    )
+
+    # 常驻连接全部借出时，最多额外创建的溢出连接数
+    fun_content_db_pool_max_overflow: int = Field(
+        default=5,
+        env="FUN_CONTENT_DB_POOL_MAX_OVERFLOW"
+    )
+
+    # 获取连接的最长等待时间（秒）
+    fun_content_db_pool_timeout: float = Field(
+        default=5.0,
+        env="FUN_CONTENT_DB_POOL_TIMEOUT"
+    )
+
+    # 以只读方式打开内容数据库（mode=ro + query_only），不会写入数据库文件；
+    # 数据库处于WAL模式时自动改用 immutable=1 打开，避免产生 -wal/-shm 文件
+    fun_content_db_read_only: bool = Field(
+        default=True,
+        env="FUN_CONTENT_DB_READ_ONLY"
+    )
+
+    # 只读模式下改用 immutable=1 打开，跳过文件锁和变更检测；数据库文件在运行期间不能被修改
+    fun_content_db_immutable: bool = Field(
+        default=False,
+        env="FUN_CONTENT_DB_IMMUTABLE"
+    )
+
+    # 连接池内的连接共享同一页缓存
+    fun_content_db_shared_cache: bool = Field(
+        default=False,
+        env="FUN_CONTENT_DB_SHARED_CACHE"
+    )
+
+    # 内存映射大小（字节，0为关闭）
+    fun_content_db_mmap_size: int = Field(
+        default=64 * 1024 * 1024,
+        env="FUN_CONTENT_DB_MMAP_SIZE"
+    )
+
+    # 每个连接的页缓存大小，与 PRAGMA cache_size 含义相同（负数表示KiB），不配置则使用SQLite默认值
+    fun_content_db_cache_size: Optional[int] = Field(
+        default=None,
+        env="FUN_CONTENT_DB_CACHE_SIZE"
+    )
+
+    # 随机行索引的刷新间隔（秒），超过该间隔后会校验数据表是否变化
+    fun_content_random_index_refresh: int = Field(
+        default=300,
+        env="FUN_CONTENT_RANDOM_INDEX_REFRESH"
+    )
+
+    # 内容预取缓冲区大小（每个命令预先取出的条数，0为关闭预取）
+    fun_content_prefetch_size: int = Field(
+        default=20,
+        env="FUN_CONTENT_PREFETCH_SIZE"
+    )
+
+    # 缓冲区低水位，剩余条数低于该值时在后台批量补充
+    fun_content_prefetch_low_water: int = Field(
+        default=5,
+        env="FUN_CONTENT_PREFETCH_LOW_WATER"
+    )
+
     # API URLs配置
     fun_content_api_urls: Dict[str, str] = Field(
     default={
@@ -21,6 +102,94 @@ class Config(BaseModel):
     env="FUN_CONTENT_API_URLS",
 )
 
+    # 各API端点的超时配置（秒），可设置 connect/read/write/pool，未配置的项使用默认的10秒
+    fun_content_api_timeouts: Dict[str, Dict[str, float]] = Field(
+        default={
+            "weibo_hot": {"connect": 3.0, "read": 5.0},
+            "douyin_hot": {"connect": 3.0, "read": 5.0},
+            "cp": {"connect": 5.0, "read": 15.0},
+        },
+        env="FUN_CONTENT_API_TIMEOUTS"
+    )
+
+    # 每个API端点的HTTP连接数上限
+    fun_content_http_max_connections: int = Field(
+        default=10,
+        env="FUN_CONTENT_HTTP_MAX_CONNECTIONS"
+    )
+
+    # 每个API端点保持的空闲连接数上限
+    fun_content_http_max_keepalive: int = Field(
+        default=5,
+        env="FUN_CONTENT_HTTP_MAX_KEEPALIVE"
+    )
+
+    # 空闲连接的保持时间（秒）
+    fun_content_http_keepalive_expiry: float = Field(
+        default=30.0,
+        env="FUN_CONTENT_HTTP_KEEPALIVE_EXPIRY"
+    )
+
+    # 启用HTTP/2（需要安装 httpx[http2]）
+    fun_content_http2: bool = Field(
+        default=False,
+        env="FUN_CONTENT_HTTP2"
+    )
+
+    # 下载图片（如CP图片）的大小上限（字节），超过时中止下载
+    fun_content_image_max_bytes: int = Field(
+        default=10 * 1024 * 1024,
+        env="FUN_CONTENT_IMAGE_MAX_BYTES"
+    )
+
+    # CP图片内存缓存大小上限（字节，0为关闭缓存）
+    fun_content_cp_cache_max_bytes: int = Field(
+        default=32 * 1024 * 1024,
+        env="FUN_CONTENT_CP_CACHE_MAX_BYTES"
+    )
+
+    # CP图片缓存时间（秒）
+    fun_content_cp_cache_ttl: int = Field(
+        default=24 * 60 * 60,
+        env="FUN_CONTENT_CP_CACHE_TTL"
+    )
+
+    # CP图片磁盘缓存目录，内存缓存淘汰的图片会写入该目录（不配置则不使用磁盘缓存）
+    fun_content_cp_cache_dir: Optional[Path] = Field(
+        default=None,
+        env="FUN_CONTENT_CP_CACHE_DIR"
+    )
+
+    # CP图片磁盘缓存大小上限（字节）
+    fun_content_cp_cache_max_disk_bytes: int = Field(
+        default=256 * 1024 * 1024,
+        env="FUN_CONTENT_CP_CACHE_MAX_DISK_BYTES"
+    )
+
+    # 热搜榜缓存时间（秒），期间的请求直接返回缓存内容
+    fun_content_hot_list_ttl: int = Field(
+        default=120,
+        env="FUN_CONTENT_HOT_LIST_TTL"
+    )
+
+    # 热搜榜后台轮询间隔（秒，0为关闭）；开启后热搜命令直接返回最近一次成功获取的内容
+    fun_content_hot_list_poll_interval: int = Field(
+        default=180,
+        env="FUN_CONTENT_HOT_LIST_POLL_INTERVAL"
+    )
+
+    # 群成员显示名称（用于cp命令@用户）缓存时间（秒）
+    fun_content_member_name_ttl: int = Field(
+        default=600,
+        env="FUN_CONTENT_MEMBER_NAME_TTL"
+    )
+
+    # 群成员显示名称缓存的最大条目数
+    fun_content_member_name_cache_size: int = Field(
+        default=4096,
+        env="FUN_CONTENT_MEMBER_NAME_CACHE_SIZE"
+    )
+
     # 功能冷却时间配置（秒）
     fun_content_cooldowns: Dict[str, int] = Field(
         default={
@@ -39,12 +208,95 @@ class Config(BaseModel):
         env="FUN_CONTENT_COOLDOWNS"
     )
 
+    # 限流配置：global 为所有请求共用，group 为每个群组（私聊为每个用户），command 为每个命令（所有群组共用）
+    # rate 为每秒补充的次数（0为不限流），burst 为允许的突发次数；超出限制的请求直接丢弃，默认不限流
+    fun_content_rate_limits: Dict[str, Dict[str, float]] = Field(
+        default={
+            "global": {"rate": 0, "burst": 30},
+            "group": {"rate": 0, "burst": 5},
+            "command": {"rate": 0, "burst": 10},
+        },
+        env="FUN_CONTENT_RATE_LIMITS"
+    )
+
+    # 冷却记录的最大条目数，超过时优先淘汰最早结束冷却的记录
+    fun_content_cooldown_max_entries: int = Field(
+        default=10000,
+        env="FUN_CONTENT_COOLDOWN_MAX_ENTRIES"
+    )
+
+    # 冷却后端：memory 只在当前进程内生效；sqlite 通过共享的数据库文件在多个进程间生效
+    fun_content_cooldown_backend: Literal["memory", "sqlite"] = Field(
+        default="memory",
+        env="FUN_CONTENT_COOLDOWN_BACKEND"
+    )
+
+    # SQLite冷却后端的数据库路径，多个进程需配置为同一个文件
+    fun_content_cooldown_db_path: Path = Field(
+        default=Path("config") / "fun_content_cooldowns.db",
+        env="FUN_CONTENT_COOLDOWN_DB_PATH"
+    )
+
+    # 定时任务向多个群组发送时，是否为每个群获取不同的内容（仅本地数据库命令）
+    fun_content_schedule_distinct_content: bool = Field(
+        default=False,
+        env="FUN_CONTENT_SCHEDULE_DISTINCT_CONTENT"
+    )
+
+    # 定时任务同时发送消息的最大群组数
+    fun_content_schedule_send_concurrency: int = Field(
+        default=5,
+        env="FUN_CONTENT_SCHEDULE_SEND_CONCURRENCY"
+    )
+
+    # 定时任务发送时间的随机错开窗口（秒，0为不错开），避免所有群组在同一秒收到消息
+    fun_content_schedule_jitter: float = Field(
+        default=0.0,
+        env="FUN_CONTENT_SCHEDULE_JITTER"
+    )
+
+    # 定时任务每秒最多发送的消息数（所有群组共用，0为不限速）
+    fun_content_schedule_send_rate: float = Field(
+        default=5.0,
+        env="FUN_CONTENT_SCHEDULE_SEND_RATE"
+    )
+
+    # 定时任务同时等待适配器返回的发送请求数上限
+    fun_content_schedule_send_max_inflight: int = Field(
+        default=5,
+        env="FUN_CONTENT_SCHEDULE_SEND_MAX_INFLIGHT"
+    )
+
+    # 运行统计（连接池、热搜榜缓存、定时发送节流、限流）的debug日志输出间隔（秒，0为关闭）
+    fun_content_stats_log_interval: int = Field(
+        default=600,
+        env="FUN_CONTENT_STATS_LOG_INTERVAL"
+    )
+
     # 持久化数据存储路径
     persistent_data_file: Path = Field(
         default=Path("config") / "persistent_data.json",
         env="PERSISTENT_DATA_FILE"
     )
 
+    # 持久化后端：json 为单个JSON文件，sqlite 为按行写入的SQLite数据库（首次启动时自动迁移JSON文件中的数据）
+    fun_content_persistent_backend: Literal["json", "sqlite"] = Field(
+        default="json",
+        env="FUN_CONTENT_PERSISTENT_BACKEND"
+    )
+
+    # SQLite持久化后端的数据库路径
+    fun_content_persistent_db_path: Path = Field(
+        default=Path("config") / "fun_content_state.db",
+        env="FUN_CONTENT_PERSISTENT_DB_PATH"
+    )
+
+    # 持久化数据的合并写入延迟（秒），期间的多次变更只写入一次文件
+    fun_content_persist_delay: float = Field(
+        default=1.0,
+        env="FUN_CONTENT_PERSIST_DELAY"
+    )
+
     # 可用命令列表
     COMMANDS: List[str] = [
         "hitokoto", "twq", "dog", "renjian", "weibo_hot", "douyin_hot",
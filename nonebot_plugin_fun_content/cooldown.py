@@ -0,0 +1,246 @@
+import abc
+import asyncio
+import heapq
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import aiosqlite
+
+from nonebot import logger
+from .config import plugin_config
+
+CooldownKey = Tuple[str, str, str]  # (命令, 群组ID, 用户ID)
+
+
+class CooldownStore:
+    """命令冷却记录
+    - 以 (命令, 群组, 用户) 为键的扁平字典保存冷却结束时间，查询为O(1)
+    - 结束时间同时记录在最小堆中，每次写入时清理已过期的条目
+    - 条目数超过 max_size 时优先淘汰最早结束冷却的条目
+    """
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._expires: Dict[CooldownKey, float] = {}  # 键 -> 冷却结束时间（monotonic）
+        self._heap: List[Tuple[float, CooldownKey]] = []  # (结束时间, 键)，键被覆盖后旧记录在出堆时忽略
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+    def remaining(self, command: str, user_id: str, group_id: str) -> float:
+        """
+        获取命令剩余冷却时间
+        Args:
+            command: 命令名称
+            user_id: 用户ID
+            group_id: 群组ID
+        Returns:
+            float: 剩余冷却时间（秒），不在冷却中时返回0
+        """
+        expires = self._expires.get((command, group_id, user_id))
+        if expires is None:
+            return 0
+        return max(0, expires - time.monotonic())
+
+    def set(self, command: str, user_id: str, group_id: str, duration: float) -> None:
+        """
+        设置命令冷却时间
+        Args:
+            command: 命令名称
+            user_id: 用户ID
+            group_id: 群组ID
+            duration: 冷却时长（秒）
+        """
+        now = time.monotonic()
+        self._sweep(now)
+        if duration <= 0:
+            return
+
+        key = (command, group_id, user_id)
+        expires = now + duration
+        self._expires[key] = expires
+        heapq.heappush(self._heap, (expires, key))
+
+        while len(self._expires) > self.max_size:
+            self._pop()
+
+        # 同一键被反复覆盖时堆中会积累旧记录，过多时重建
+        if len(self._heap) > 2 * len(self._expires) + 64:
+            self._heap = [(expires, key) for key, expires in self._expires.items()]
+            heapq.heapify(self._heap)
+
+    def delete(self, command: str, user_id: str, group_id: str) -> None:
+        """移除冷却记录（堆中的旧记录在出堆时忽略）"""
+        self._expires.pop((command, group_id, user_id), None)
+
+    def clear(self) -> None:
+        self._expires.clear()
+        self._heap.clear()
+
+    def _sweep(self, now: float) -> None:
+        """移除所有已结束冷却的条目"""
+        while self._heap and self._heap[0][0] <= now:
+            self._pop()
+
+    def _pop(self) -> None:
+        """弹出堆顶记录，记录仍有效时同时删除对应条目"""
+        expires, key = heapq.heappop(self._heap)
+        if self._expires.get(key) == expires:
+            del self._expires[key]
+
+
+class CooldownBackend(abc.ABC):
+    """冷却后端接口
+    - acquire 原子地检查并设置冷却：不在冷却中时立即开始冷却，否则返回剩余时间
+    - 命令执行失败时调用 release 撤销本次冷却
+    - 未实现 acquire 或 release 的后端在创建时即报错
+    """
+    @abc.abstractmethod
+    async def acquire(self, command: str, user_id: str, group_id: str, duration: float) -> float:
+        """
+        检查冷却并在未冷却时开始冷却
+        Args:
+            command: 命令名称
+            user_id: 用户ID
+            group_id: 群组ID
+            duration: 冷却时长（秒）
+        Returns:
+            float: 剩余冷却时间（秒），为0表示已开始新的冷却，可以执行命令
+        """
+
+    @abc.abstractmethod
+    async def release(self, command: str, user_id: str, group_id: str) -> None:
+        """撤销冷却"""
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryCooldownBackend(CooldownBackend):
+    """进程内冷却后端（默认），冷却只在当前进程内生效"""
+    def __init__(self, max_size: int = 10000):
+        self.store = CooldownStore(max_size)
+
+    async def acquire(self, command: str, user_id: str, group_id: str, duration: float) -> float:
+        remaining = self.store.remaining(command, user_id, group_id)
+        if remaining > 0:
+            return remaining
+        self.store.set(command, user_id, group_id, duration)
+        return 0
+
+    async def release(self, command: str, user_id: str, group_id: str) -> None:
+        self.store.delete(command, user_id, group_id)
+
+
+class SqliteCooldownBackend(CooldownBackend):
+    """共享SQLite文件的冷却后端
+    - 多个进程使用同一个数据库文件，冷却在所有进程间生效
+    - 检查并设置通过一条带条件的 UPSERT 完成，由SQLite的写锁保证原子性
+    - 本进程已知处于冷却中的请求直接由内存记录拒绝，不访问数据库
+    - 冷却时间使用系统时间（time.time），各进程所在机器的时钟需保持同步
+    """
+    SCHEMA = (
+        """CREATE TABLE IF NOT EXISTS cooldowns (
+            command TEXT NOT NULL,
+            group_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            expires REAL NOT NULL,
+            PRIMARY KEY (command, group_id, user_id)
+        ) WITHOUT ROWID"""
+    )
+    # 只有原记录已过期时才会覆盖，受影响行数为1表示取得冷却
+    ACQUIRE = (
+        "INSERT INTO cooldowns (command, group_id, user_id, expires) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (command, group_id, user_id) DO UPDATE SET expires = excluded.expires "
+        "WHERE cooldowns.expires <= ?"
+    )
+    # 清理过期记录的间隔（秒）
+    PURGE_INTERVAL = 60.0
+
+    def __init__(self, db_path: Path, max_size: int = 10000):
+        self.db_path = db_path
+        self.local = CooldownStore(max_size)  # 本进程已知的冷却
+        self._conn: Optional[aiosqlite.Connection] = None
+        self._open_lock = asyncio.Lock()
+        self._last_purge = 0.0
+
+    async def _connect(self) -> aiosqlite.Connection:
+        """首次使用时打开数据库"""
+        if self._conn is not None:
+            return self._conn
+        async with self._open_lock:
+            if self._conn is None:
+                self.db_path.parent.mkdir(parents=True, exist_ok=True)
+                conn = await aiosqlite.connect(self.db_path, isolation_level=None)
+                await conn.execute("PRAGMA busy_timeout=5000")
+                await conn.execute("PRAGMA journal_mode=WAL")
+                await conn.execute("PRAGMA synchronous=NORMAL")
+                await conn.execute(self.SCHEMA)
+                self._conn = conn
+        return self._conn
+
+    async def acquire(self, command: str, user_id: str, group_id: str, duration: float) -> float:
+        remaining = self.local.remaining(command, user_id, group_id)
+        if remaining > 0 or duration <= 0:
+            return remaining
+
+        try:
+            remaining = await self._acquire_shared(command, user_id, group_id, duration)
+        except Exception as e:
+            # 数据库不可用时退化为只在本进程内生效
+            logger.error(f"Shared cooldown check failed, falling back to local cooldown: {e}")
+            remaining = 0
+        self.local.set(command, user_id, group_id, remaining or duration)
+        return remaining
+
+    async def _acquire_shared(self, command: str, user_id: str, group_id: str, duration: float) -> float:
+        conn = await self._connect()
+        now = time.time()
+        key = (command, group_id, user_id)
+        async with conn.execute(self.ACQUIRE, (*key, now + duration, now)) as cursor:
+            acquired = cursor.rowcount == 1
+
+        remaining = 0
+        if not acquired:
+            # 其他进程设置的冷却，读取剩余时间
+            async with conn.execute(
+                "SELECT expires FROM cooldowns WHERE command = ? AND group_id = ? AND user_id = ?", key
+            ) as cursor:
+                row = await cursor.fetchone()
+            remaining = max(0, row[0] - time.time()) if row else 0
+
+        if now - self._last_purge > self.PURGE_INTERVAL:
+            self._last_purge = now
+            await conn.execute("DELETE FROM cooldowns WHERE expires <= ?", (now,))
+        return remaining
+
+    async def release(self, command: str, user_id: str, group_id: str) -> None:
+        self.local.delete(command, user_id, group_id)
+        if self._conn is None:
+            return
+        try:
+            await self._conn.execute(
+                "DELETE FROM cooldowns WHERE command = ? AND group_id = ? AND user_id = ?",
+                (command, group_id, user_id),
+            )
+        except Exception as e:
+            logger.error(f"Failed to release cooldown: {e}")
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+
+def create_cooldown_backend() -> CooldownBackend:
+    """根据配置创建冷却后端"""
+    if plugin_config.fun_content_cooldown_backend == "sqlite":
+        return SqliteCooldownBackend(
+            Path(plugin_config.fun_content_cooldown_db_path),
+            plugin_config.fun_content_cooldown_max_entries,
+        )
+    return MemoryCooldownBackend(plugin_config.fun_content_cooldown_max_entries)
+
+
+# 创建冷却后端实例
+cooldowns = create_cooldown_backend()
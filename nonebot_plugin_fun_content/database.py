@@ -1,6 +1,12 @@
 import asyncio
+import hashlib
+import random
+import sqlite3
+import sys
+import time
+from array import array
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set, Tuple
 from contextlib import asynccontextmanager
 
 import aiosqlite
@@ -11,15 +17,39 @@ from .config import plugin_config
 
 class DatabasePool:
     """数据库连接池
-    - 管理多个数据库连接，提高并发访问效率
-    - 实现连接的获取、释放和自动回收
+    - 空闲连接保存在 asyncio.Queue 中，获取和归还都无需加锁
+    - 使用信号量限制同时借出的连接数：常驻 pool_size 个，额外最多 max_overflow 个
+    - 获取连接超时抛出 asyncio.TimeoutError，出错的连接经健康检查后再决定复用或关闭
+    - 统计等待时间、借出数量和溢出次数
     """
-    def __init__(self, db_path: Path, pool_size: int = 5):
+    def __init__(self, db_path: Path, pool_size: int = 5,
+                 max_overflow: int = 5, timeout: float = 5.0,
+                 read_only: bool = False, immutable: bool = False,
+                 shared_cache: bool = False, mmap_size: int = 0,
+                 cache_size: Optional[int] = None):
         self.db_path = db_path
         self.pool_size = pool_size
-        self._pool: List[aiosqlite.Connection] = []  # 连接池列表
-        self._pool_lock = asyncio.Lock()  # 用于线程安全的锁
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.read_only = read_only  # 以 mode=ro 打开，并禁止写入
+        self.immutable = immutable  # 以 immutable=1 打开，跳过文件锁和变更检测
+        self.shared_cache = shared_cache  # 池内连接共享同一页缓存
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+        self.attachments: Dict[str, str] = {}  # 附加数据库：模式名 -> 数据库URI
+        self._idle: asyncio.Queue = asyncio.Queue()  # 空闲连接队列
+        self._slots = asyncio.Semaphore(pool_size + max_overflow)  # 可借出的连接数
+        self._init_lock = asyncio.Lock()  # 仅用于初始化
         self._initialized = False  # 初始化状态标志
+        self._size = 0  # 当前打开的连接总数
+        self._in_use = 0  # 当前借出的连接数
+
+        # 统计数据
+        self._acquired_total = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._overflow_total = 0
+        self._timeouts = 0
 
     async def initialize(self):
         """初始化连接池
@@ -29,87 +59,443 @@ class DatabasePool:
         if self._initialized:
             return
 
-        async with self._pool_lock:
+        async with self._init_lock:
             if self._initialized:  # 双重检查锁定模式
                 return
 
             for _ in range(self.pool_size):
-                conn = await self._create_connection()
-                self._pool.append(conn)
+                self._idle.put_nowait(await self._create_connection())
+                self._size += 1
 
             self._initialized = True
             logger.success(f"Database pool initialized with {self.pool_size} connections")
 
+    def connection_uri(self) -> str:
+        """根据配置生成数据库URI"""
+        params = []
+        if self.read_only:
+            params.append("immutable=1" if self.immutable else "mode=ro")
+        if self.shared_cache:
+            params.append("cache=shared")
+        uri = self.db_path.resolve().as_uri()
+        return f"{uri}?{'&'.join(params)}" if params else uri
+
     async def _create_connection(self) -> aiosqlite.Connection:
         """创建新的数据库连接
-        - 设置数据库连接参数
-        - 启用WAL模式提高并发性能
-        - 启用外键约束
+        - 只读模式下以只读URI打开并启用 query_only，不产生 -wal/-shm 文件
+        - 读写模式下启用WAL模式提高并发性能，并启用外键约束
+        - 按配置设置内存映射大小和页缓存大小，并附加 attachments 中的数据库
         """
-        conn = await aiosqlite.connect(self.db_path)
-        await conn.execute("PRAGMA journal_mode=WAL")  # 启用WAL模式
-        await conn.execute("PRAGMA foreign_keys=ON")   # 启用外键约束
+        conn = await aiosqlite.connect(self.connection_uri(), uri=True)
+        for name, uri in self.attachments.items():
+            await conn.execute(f"ATTACH DATABASE ? AS {name}", (uri,))
+        if self.read_only:
+            await conn.execute("PRAGMA query_only=ON")    # 禁止任何写入
+        else:
+            await conn.execute("PRAGMA main.journal_mode=WAL")  # 启用WAL模式（不影响附加的只读数据库）
+            await conn.execute("PRAGMA foreign_keys=ON")   # 启用外键约束
+        await conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        if self.cache_size is not None:
+            await conn.execute(f"PRAGMA cache_size={int(self.cache_size)}")
         conn.row_factory = aiosqlite.Row  # 设置行工厂为字典类型
         return conn
 
+    @staticmethod
+    async def _is_healthy(conn: aiosqlite.Connection) -> bool:
+        """检查连接是否仍可用"""
+        try:
+            async with conn.execute("SELECT 1") as cursor:
+                await cursor.fetchone()
+            return True
+        except Exception:
+            return False
+
+    async def _discard(self, conn: aiosqlite.Connection):
+        """关闭连接并从计数中移除"""
+        self._size -= 1
+        try:
+            await conn.close()
+        except Exception as e:
+            logger.warning(f"Error closing database connection: {e}")
+
+    async def _release(self, conn: aiosqlite.Connection, check: bool = False):
+        """归还连接
+        - check为True时（使用过程中发生异常）先做健康检查
+        - 常驻连接放回队列，溢出连接或不健康的连接直接关闭
+        """
+        self._in_use -= 1
+        if not self._initialized or (check and not await self._is_healthy(conn)):
+            await self._discard(conn)
+        elif self._idle.qsize() < self.pool_size:
+            self._idle.put_nowait(conn)
+        else:
+            await self._discard(conn)
+
     @asynccontextmanager
     async def acquire(self):
         """获取数据库连接的上下文管理器
-        - 从连接池获取连接或创建新连接
-        - 使用完毕后自动释放连接回池中
-        - 发生异常时关闭连接
+        - 优先复用空闲连接，没有空闲连接时在上限内创建溢出连接
+        - 达到上限时排队等待，超过 timeout 秒抛出 asyncio.TimeoutError
+        - 使用完毕后自动归还连接
         """
         if not self._initialized:
             await self.initialize()
 
-        async with self._pool_lock:
-            # 从池中获取连接
-            if self._pool:
-                conn = self._pool.pop()
-            else:
-                # 如果池为空，创建新连接
-                conn = await self._create_connection()
-                logger.warning("Connection pool exhausted, creating new connection")
-
+        start = time.monotonic()
         try:
-            yield conn
-            # 将连接放回池中
-            async with self._pool_lock:
-                if len(self._pool) < self.pool_size:
-                    self._pool.append(conn)
-                else:
-                    await conn.close()
-        except Exception as e:
-            # 发生错误时，确保连接被关闭而不是放回池中
-            await conn.close()
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            logger.warning(f"Timed out after {self.timeout}s waiting for a database connection")
             raise
 
+        try:
+            waited = time.monotonic() - start
+            self._acquired_total += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+            try:
+                conn = self._idle.get_nowait()
+            except asyncio.QueueEmpty:
+                # 常驻连接全部借出，在上限内创建溢出连接
+                conn = await self._create_connection()
+                self._size += 1
+                if self._size > self.pool_size:
+                    self._overflow_total += 1
+                    logger.debug(f"Connection pool exhausted, opened overflow connection ({self._size} open)")
+            self._in_use += 1
+
+            try:
+                yield conn
+            except asyncio.CancelledError:
+                # 任务被取消时不再等待健康检查，直接在后台关闭连接
+                self._in_use -= 1
+                asyncio.ensure_future(self._discard(conn))
+                raise
+            except Exception:
+                await self._release(conn, check=True)
+                raise
+            else:
+                await self._release(conn)
+        finally:
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """获取连接池统计数据"""
+        return {
+            "size": self._size,
+            "idle": self._idle.qsize(),
+            "in_use": self._in_use,
+            "overflow": max(0, self._size - self.pool_size),
+            "overflow_total": self._overflow_total,
+            "acquired_total": self._acquired_total,
+            "wait_avg_ms": self._wait_total / self._acquired_total * 1000 if self._acquired_total else 0.0,
+            "wait_max_ms": self._wait_max * 1000,
+            "timeouts": self._timeouts,
+        }
+
     async def close_all(self):
         """关闭所有连接
-        - 清理连接池中的所有连接
+        - 关闭所有空闲连接，借出中的连接在归还时关闭
         - 设置初始化状态为False
         """
-        async with self._pool_lock:
-            for conn in self._pool:
-                await conn.close()
-            self._pool.clear()
+        async with self._init_lock:
             self._initialized = False
+            while not self._idle.empty():
+                await self._discard(self._idle.get_nowait())
         logger.success("All database connections closed")
 
 
+def is_wal_database(db_path: Path) -> bool:
+    """检查数据库文件是否处于WAL模式（只读取文件头，不打开连接）
+    - 文件头第18、19字节为2表示WAL
+    - 只读连接打开WAL数据库时仍会创建 -wal/-shm 文件
+    """
+    with open(db_path, "rb") as f:
+        header = f.read(20)
+    return len(header) >= 20 and header[18] == 2
+
+
+# 预处理缓存在连接中的附加模式名
+RENDER_SCHEMA = "rendered"
+# 文本处理规则变化时递增，使已有的预处理缓存全部重建
+RENDER_VERSION = 1
+
+
+def _table_digest(source: sqlite3.Connection, table: str, column: str) -> str:
+    """计算数据表内容的哈希（包含rowid和处理规则版本）"""
+    digest = hashlib.sha256(f"{RENDER_VERSION}:{column}".encode())
+    for rowid, content in source.execute(f"SELECT rowid, {column} FROM {table} ORDER BY rowid"):
+        digest.update(f"{rowid}\0{content or ''}\0".encode())
+    return digest.hexdigest()
+
+
+def render_content_tables(source_uri: str, cache_path: Path,
+                          tables: Dict[str, str], process) -> Tuple[List[str], List[str]]:
+    """将内容数据表预处理后写入缓存数据库
+    - 缓存中每个数据表保留原rowid，内容为处理后的文本
+    - 按数据表内容哈希判断是否需要重建，内容未变化时只读取一遍原表
+    - 重建在一个 BEGIN IMMEDIATE 事务中完成，共享缓存文件的其他连接不会读到空表；
+      获得写锁后再次比较哈希，多个进程同时启动时只重建一次
+    - 原表不存在或读取失败时跳过该表
+    Args:
+        source_uri: 内容数据库URI
+        cache_path: 缓存数据库路径
+        tables: 数据表名 -> 内容列名
+        process: 文本处理函数
+    Returns:
+        Tuple[List[str], List[str]]: (缓存中可用的数据表, 本次重建的数据表)
+    """
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    source = sqlite3.connect(source_uri, uri=True)
+    cache = sqlite3.connect(cache_path, isolation_level=None)  # 手动管理事务
+    try:
+        cache.execute("CREATE TABLE IF NOT EXISTS render_meta (name TEXT PRIMARY KEY, digest TEXT NOT NULL)")
+
+        available, rebuilt = [], []
+        for table, column in tables.items():
+            try:
+                digest = _table_digest(source, table, column)
+            except sqlite3.Error as e:
+                logger.warning(f"Skipping render cache for {table}: {e}")
+                continue
+
+            if _stored_digest(cache, table) != digest:
+                cache.execute("BEGIN IMMEDIATE")
+                try:
+                    if _stored_digest(cache, table) != digest:  # 等待写锁期间可能已被其他进程重建
+                        cache.execute(f"DROP TABLE IF EXISTS {table}")
+                        cache.execute(f"CREATE TABLE {table} (id INTEGER PRIMARY KEY, content TEXT NOT NULL)")
+                        cache.executemany(
+                            f"INSERT INTO {table} (id, content) VALUES (?, ?)",
+                            ((rowid, process(content)) for rowid, content in
+                             source.execute(f"SELECT rowid, {column} FROM {table}"))
+                        )
+                        cache.execute(
+                            "INSERT OR REPLACE INTO render_meta (name, digest) VALUES (?, ?)", (table, digest)
+                        )
+                        rebuilt.append(table)
+                    cache.execute("COMMIT")
+                except BaseException:
+                    cache.execute("ROLLBACK")
+                    raise
+            available.append(table)
+        return available, rebuilt
+    finally:
+        source.close()
+        cache.close()
+
+
+def file_signature(db_path: Path) -> Tuple[Optional[Tuple[int, int]], ...]:
+    """数据库文件及其 -wal 文件的 (修改时间, 大小)，用于低成本地判断内容是否可能发生变化"""
+    signature = []
+    for path in (db_path, db_path.with_name(db_path.name + "-wal")):
+        try:
+            stat = path.stat()
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def _stored_digest(cache: sqlite3.Connection, table: str) -> Optional[str]:
+    """读取缓存中数据表的内容哈希，数据表不存在时返回None"""
+    row = cache.execute(
+        "SELECT digest FROM render_meta WHERE name = ? "
+        "AND EXISTS (SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?)",
+        (table, table)
+    ).fetchone()
+    return row[0] if row else None
+
+
+class RowidIndex:
+    """数据表随机行索引
+    - 一次性加载数据表的rowid范围（连续时）或rowid列表（有空洞时）
+    - 在内存中随机选取rowid，再按主键取出单行，避免 ORDER BY RANDOM() 全表扫描排序
+    - 通过 (行数, 最小rowid, 最大rowid) 签名判断数据表是否发生变化
+    """
+    def __init__(self, table: str):
+        self.table = table
+        self._range: Optional[Tuple[int, int]] = None  # 连续rowid的闭区间
+        self._ids: Optional[array] = None  # 非连续时的rowid列表
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self._checked_at = 0.0  # 上次校验签名的时间
+        self.lock = asyncio.Lock()  # 防止并发重复加载
+
+    @property
+    def loaded(self) -> bool:
+        return self._signature is not None
+
+    def __len__(self) -> int:
+        return self._signature[0] if self._signature else 0
+
+    def is_stale(self, interval: float) -> bool:
+        """距离上次校验是否已超过刷新间隔"""
+        return not self.loaded or time.monotonic() - self._checked_at >= interval
+
+    def invalidate(self):
+        """标记为需要校验，下次使用时重新比较签名"""
+        self._checked_at = 0.0
+
+    async def _read_signature(self, conn: aiosqlite.Connection) -> Tuple[int, int, int]:
+        async with conn.execute(
+            f"SELECT count(*), min(rowid), max(rowid) FROM {self.table}"
+        ) as cursor:
+            count, low, high = await cursor.fetchone()
+        return count or 0, low or 0, high or 0
+
+    async def load(self, conn: aiosqlite.Connection):
+        """从数据库加载rowid索引"""
+        count, low, high = signature = await self._read_signature(conn)
+        if count and high - low + 1 == count:
+            # rowid连续，只需记录范围
+            self._range, self._ids = (low, high), None
+        elif count:
+            async with conn.execute(f"SELECT rowid FROM {self.table}") as cursor:
+                rows = await cursor.fetchall()
+            self._range, self._ids = None, array("q", (row[0] for row in rows))
+        else:
+            self._range, self._ids = None, None
+
+        self._signature = signature
+        self._checked_at = time.monotonic()
+        logger.debug(f"Rowid index loaded for {self.table}: {count} rows")
+
+    async def refresh(self, conn: aiosqlite.Connection):
+        """校验签名，仅在数据表变化时重新加载"""
+        if self.loaded and await self._read_signature(conn) == self._signature:
+            self._checked_at = time.monotonic()
+            return
+        await self.load(conn)
+
+    def pick(self) -> Optional[int]:
+        """随机选取一个rowid，数据表为空时返回None"""
+        if self._range:
+            return random.randint(*self._range)
+        if self._ids:
+            return random.choice(self._ids)
+        return None
+
+    def sample(self, k: int) -> List[int]:
+        """随机选取至多k个不重复的rowid"""
+        if self._range:
+            population = range(self._range[0], self._range[1] + 1)
+        elif self._ids:
+            population = self._ids
+        else:
+            return []
+        return random.sample(population, min(k, len(population)))
+
+
+async def existing_tables(conn: aiosqlite.Connection) -> Set[str]:
+    """查询数据库中已存在的数据表名称（只读取 sqlite_master）"""
+    async with conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'") as cursor:
+        return {row[0] for row in await cursor.fetchall()}
+
+
+class MemoryContentStore:
+    """内存内容存储
+    - 将只读的内容数据表一次性读入内存中的紧凑数组
+    - 普通命令每个对应一个已处理好的字符串列表，神回复使用问题/答案两个平行列表
+    - 随机选取直接在数组上完成，不产生任何I/O
+    """
+    def __init__(self):
+        self.contents: Dict[str, List[str]] = {}  # 命令 -> 内容列表
+        self.questions: List[str] = []  # 神回复问题列表
+        self.answers: List[str] = []  # 神回复答案列表（与问题列表一一对应）
+        self.missing: List[str] = []  # 加载时缺失的数据表
+        self.loaded = False
+
+    async def load(self, conn: aiosqlite.Connection, table_config: Dict[str, Dict[str, Any]]):
+        """从数据库加载全部内容，并在日志中报告耗时和内存占用
+        - 缺失的数据表记录警告后跳过，只有对应的命令不可用
+        """
+        start = time.perf_counter()
+        existing = await existing_tables(conn)
+        for command, config in table_config.items():
+            if config["table"] not in existing:
+                logger.warning(f"Table {config['table']} not found, {command} will be unavailable")
+                self.missing.append(config["table"])
+                continue
+            if command == "shenhuifu":
+                async with conn.execute(
+                    f"SELECT {config['questions_column']}, {config['answers_column']} FROM {config['table']}"
+                ) as cursor:
+                    rows = await cursor.fetchall()
+                self.questions = [row[0] for row in rows]
+                self.answers = [row[1] for row in rows]
+                continue
+
+            async with conn.execute(f"SELECT {config['content_column']} FROM {config['table']}") as cursor:
+                rows = await cursor.fetchall()
+            if config.get("process_br", False):
+                self.contents[command] = [DatabaseManager._process_text(row[0]) for row in rows]
+            else:
+                self.contents[command] = [row[0] for row in rows]
+
+        self.loaded = True
+        elapsed = (time.perf_counter() - start) * 1000
+        rows = sum(len(items) for items in self.contents.values()) + len(self.questions)
+        logger.success(
+            f"Memory content store loaded {rows} rows in {elapsed:.1f} ms, "
+            f"using about {self.memory_usage() / 1024 / 1024:.2f} MiB"
+        )
+
+    def memory_usage(self) -> int:
+        """估算内容数组占用的内存（字节）"""
+        arrays = list(self.contents.values()) + [self.questions, self.answers]
+        return sum(sys.getsizeof(items) + sum(sys.getsizeof(item) for item in items) for items in arrays)
+
+    def pick(self, command: str) -> Optional[str]:
+        items = self.contents.get(command)
+        return random.choice(items) if items else None
+
+    def pick_shenhuifu(self) -> Optional[Dict[str, str]]:
+        if not self.questions:
+            return None
+        i = random.randrange(len(self.questions))
+        return {"question": self.questions[i], "answer": self.answers[i]}
+
+    def sample(self, command: str, k: int) -> List[str]:
+        items = self.contents.get(command) or []
+        return random.sample(items, min(k, len(items)))
+
+    def sample_shenhuifu(self, k: int) -> List[Dict[str, str]]:
+        indexes = random.sample(range(len(self.questions)), min(k, len(self.questions)))
+        return [{"question": self.questions[i], "answer": self.answers[i]} for i in indexes]
+
+
 class DatabaseManager:
     def __init__(self):
         """初始化数据库管理器
         - 加载数据库配置
-        - 初始化数据库连接池
+        - 创建数据库连接池（不建立连接，首次使用或预热时再初始化）
         - 配置各数据表结构信息
         """
         self.db_path = plugin_config.fun_content_db_path
-        if not self.db_path.exists():
-            logger.error(f"Database file not found at {self.db_path}")
-            raise FileNotFoundError(f"Database file not found at {self.db_path}")
-
-        self.pool = DatabasePool(self.db_path)
+        self.pool = DatabasePool(
+            self.db_path,
+            pool_size=plugin_config.fun_content_db_pool_size,
+            max_overflow=plugin_config.fun_content_db_pool_max_overflow,
+            timeout=plugin_config.fun_content_db_pool_timeout,
+            read_only=plugin_config.fun_content_db_read_only,
+            immutable=plugin_config.fun_content_db_immutable,
+            shared_cache=plugin_config.fun_content_db_shared_cache,
+            mmap_size=plugin_config.fun_content_db_mmap_size,
+            cache_size=plugin_config.fun_content_db_cache_size,
+        )
+        self._ready = False  # 数据库文件检查和连接池初始化是否完成
+        self._init_lock = asyncio.Lock()
+        self._indexes: Dict[str, RowidIndex] = {}  # 表名 -> 随机行索引
+        self.index_refresh_interval = plugin_config.fun_content_random_index_refresh
+        # 内存模式下内容全部读入内存，不再查询数据库
+        self.memory_store = MemoryContentStore() if plugin_config.fun_content_db_backend == "memory" else None
+        self.render_cache_path = plugin_config.fun_content_db_render_cache
+        self._rendered: Dict[str, str] = {}  # 原表名 -> 预处理缓存中的表名
+        self._render_columns: Dict[str, str] = {}  # 需要预处理的原表名 -> 内容列名
+        self._render_signature = None  # 上次校验预处理缓存时内容数据库文件的签名
+        self._render_lock = asyncio.Lock()  # 防止后台校验重叠
 
         # 定义数据库表配置
         self.table_config = {
@@ -167,13 +553,170 @@ class DatabaseManager:
         content = content.replace("<br>", "\n").replace("<br/>", "\n")
         return "\n".join(line.strip() for line in content.split("\n") if line.strip())
 
+    async def initialize(self):
+        """初始化数据库
+        - 检查数据库文件是否存在（在线程中执行，不阻塞事件循环）
+        - 初始化连接池，内存模式下读入全部内容后关闭连接池
+        Raises:
+            FileNotFoundError: 数据库文件不存在
+        """
+        if self._ready:
+            return
+
+        async with self._init_lock:
+            if self._ready:  # 双重检查锁定模式
+                return
+
+            if not await asyncio.to_thread(self.db_path.exists):
+                logger.error(f"Database file not found at {self.db_path}")
+                raise FileNotFoundError(f"Database file not found at {self.db_path}")
+
+            if self.pool.read_only and not self.pool.immutable:
+                if await asyncio.to_thread(is_wal_database, self.db_path):
+                    self.pool.immutable = True
+                    logger.warning(
+                        f"{self.db_path} is in WAL mode, read-only connections would create -wal/-shm files; "
+                        "opening it with immutable=1 instead, changes to the file during runtime will not be detected"
+                    )
+
+            if self.memory_store:
+                async with self.pool.acquire() as conn:
+                    await self.memory_store.load(conn, self.table_config)
+                await self.pool.close_all()
+            else:
+                if self.render_cache_path:
+                    await self._prepare_render_cache()
+                await self.pool.initialize()
+            self._ready = True
+
+    async def _prepare_render_cache(self):
+        """准备预处理内容缓存
+        - 在线程中校验各数据表的内容哈希，仅重建发生变化的表
+        - 缓存以只读方式附加到连接池的每个连接上，请求时直接读取处理好的文本
+        - 运行期间由后台任务定期检查内容是否变化（见 refresh_render_cache）
+        - 构建失败时记录警告，退回到每次请求时处理文本
+        """
+        self._render_columns = {
+            config["table"]: config["content_column"]
+            for config in self.table_config.values() if config.get("process_br", False)
+        }
+        start = time.perf_counter()
+        try:
+            # 在计算哈希之前记录文件签名，计算期间发生的变更会在下次检查时发现
+            self._render_signature = await asyncio.to_thread(file_signature, self.db_path)
+            available, rebuilt = await asyncio.to_thread(
+                render_content_tables, self.pool.connection_uri(), self.render_cache_path,
+                self._render_columns, self._process_text
+            )
+        except Exception as e:
+            logger.warning(f"Failed to prepare render cache at {self.render_cache_path}, "
+                           f"content will be processed per request: {e}")
+            return
+
+        self.pool.attachments[RENDER_SCHEMA] = f"{self.render_cache_path.resolve().as_uri()}?mode=ro"
+        self._rendered = {table: f"{RENDER_SCHEMA}.{table}" for table in available}
+        elapsed = (time.perf_counter() - start) * 1000
+        logger.info(
+            f"Render cache ready for {len(available)} tables in {elapsed:.1f} ms"
+            + (f", rebuilt: {', '.join(rebuilt)}" if rebuilt else "")
+        )
+
+    @property
+    def render_cache_refreshable(self) -> bool:
+        """预处理缓存是否需要在运行期间检查更新（以 immutable 方式打开的数据库不会变化）"""
+        return RENDER_SCHEMA in self.pool.attachments and not self.pool.immutable
+
+    async def refresh_render_cache(self):
+        """检查内容数据库是否变化，必要时重建预处理缓存（由后台定时任务调用）
+        - 先比较数据库文件的修改时间和大小，没有变化时不读取任何数据
+        - 文件变化后在线程中校验各表的内容哈希，仅重建内容变化的表，重建的表的随机行索引在下次使用时重新校验
+        - 全程不占用连接池中的连接，请求不会等待重建
+        - 失败时记录警告，所有表退回到查询原表并在请求时处理文本
+        """
+        if not self._ready or not self.render_cache_refreshable or self._render_lock.locked():
+            return
+
+        async with self._render_lock:
+            signature = await asyncio.to_thread(file_signature, self.db_path)
+            if signature == self._render_signature:
+                return
+
+            start = time.perf_counter()
+            try:
+                available, rebuilt = await asyncio.to_thread(
+                    render_content_tables, self.pool.connection_uri(), self.render_cache_path,
+                    self._render_columns, self._process_text
+                )
+            except Exception as e:
+                logger.warning(f"Failed to refresh render cache at {self.render_cache_path}, "
+                               f"content will be processed per request: {e}")
+                self._rendered = {}
+                return
+
+            self._render_signature = signature
+            self._rendered = {table: f"{RENDER_SCHEMA}.{table}" for table in available}
+            for table in rebuilt:
+                index = self._indexes.get(self._rendered[table])
+                if index is not None:
+                    index.invalidate()
+            if rebuilt:
+                elapsed = (time.perf_counter() - start) * 1000
+                logger.info(f"Render cache rebuilt for changed tables in {elapsed:.1f} ms: {', '.join(rebuilt)}")
+
+    def _content_source(self, config: Dict[str, Any]) -> Tuple[str, str, bool]:
+        """获取内容的查询来源
+        Returns:
+            Tuple[str, str, bool]: (数据表, 内容列, 是否需要处理文本)，已预处理的表直接读取缓存
+        """
+        rendered = self._rendered.get(config["table"])
+        if rendered:
+            return rendered, "content", False
+        return config["table"], config["content_column"], config.get("process_br", False)
+
+    @asynccontextmanager
+    async def acquire(self):
+        """获取数据库连接，必要时先完成初始化"""
+        await self.initialize()
+        async with self.pool.acquire() as conn:
+            yield conn
+
+    async def health_check(self) -> List[str]:
+        """轻量的数据库健康检查
+        - 只查询 sqlite_master，确认各内容表存在
+        Returns:
+            List[str]: 缺失的数据表名称
+        """
+        tables = {config["table"] for config in self.table_config.values()}
+        async with self.acquire() as conn:
+            existing = await existing_tables(conn)
+        return sorted(tables - existing)
+
+    async def warmup(self) -> List[str]:
+        """预热数据库
+        - 完成初始化和健康检查
+        - 预先加载各数据表的随机行索引，避免首个请求承担加载开销
+        Returns:
+            List[str]: 缺失的数据表名称
+        """
+        await self.initialize()
+        if self.memory_store:
+            # 内存模式下内容已全部读入，连接池已关闭
+            return sorted(self.memory_store.missing)
+
+        missing = await self.health_check()
+        async with self.acquire() as conn:
+            for config in self.table_config.values():
+                if config["table"] not in missing:
+                    await self._get_index(conn, self._rendered.get(config["table"], config["table"]))
+        return missing
+
     async def _fetch_one(self, query: str, params: tuple = ()) -> Optional[Dict[str, Any]]:
         """执行查询并获取单条结果
         - 使用连接池获取数据库连接
         - 执行SQL查询并返回字典形式的结果
         """
         try:
-            async with self.pool.acquire() as conn:
+            async with self.acquire() as conn:
                 async with conn.execute(query, params) as cursor:
                     row = await cursor.fetchone()
                     if row:
@@ -183,6 +726,49 @@ class DatabaseManager:
             logger.error(f"Database query error: {str(e)}")
             raise
 
+    async def _get_index(self, conn: aiosqlite.Connection, table: str, force: bool = False) -> RowidIndex:
+        """获取数据表的随机行索引
+        - 首次使用时加载，超过刷新间隔后校验数据表是否变化
+        - force为True时强制重新加载（如取到已删除的行）
+        """
+        index = self._indexes.setdefault(table, RowidIndex(table))
+        if force or index.is_stale(self.index_refresh_interval):
+            async with index.lock:
+                if force:
+                    await index.load(conn)
+                elif index.is_stale(self.index_refresh_interval):  # 双重检查
+                    await index.refresh(conn)
+        return index
+
+    async def _fetch_random_row(self, table: str, columns: List[str]) -> Optional[Dict[str, Any]]:
+        """按随机rowid从数据表取出一行
+        - 在内存中选取rowid，按主键查询单行
+        - 若该行已被删除则重新加载索引后重试一次
+        """
+        query = f"SELECT {', '.join(columns)} FROM {table} WHERE rowid = ?"
+        try:
+            async with self.acquire() as conn:
+                index = await self._get_index(conn, table)
+                for attempt in range(2):
+                    rowid = index.pick()
+                    if rowid is None:
+                        return None
+                    async with conn.execute(query, (rowid,)) as cursor:
+                        row = await cursor.fetchone()
+                    if row:
+                        return {key: row[key] for key in row.keys()}
+                    if attempt == 0:
+                        index = await self._get_index(conn, table, force=True)
+            return None
+        except Exception as e:
+            logger.error(f"Database query error: {str(e)}")
+            raise
+
+    async def _get_memory_store(self) -> MemoryContentStore:
+        """获取已加载的内存内容存储"""
+        await self.initialize()
+        return self.memory_store
+
     async def get_random_content(self, command: str) -> Optional[str]:
         """获取随机内容
         Args:
@@ -196,14 +782,13 @@ class DatabaseManager:
         if not config:
             raise ValueError(f"Unknown command: {command}")
 
-        table = config["table"]
-        content_column = config["content_column"]
-        process_br = config.get("process_br", False)
-
-        query = f"SELECT {content_column} FROM {table} ORDER BY RANDOM() LIMIT 1"
-
         try:
-            result = await self._fetch_one(query)
+            if self.memory_store:
+                return (await self._get_memory_store()).pick(command)
+
+            await self.initialize()
+            table, content_column, process_br = self._content_source(config)
+            result = await self._fetch_random_row(table, [content_column])
             if not result:
                 return None
 
@@ -219,15 +804,14 @@ class DatabaseManager:
             Optional[Dict[str, str]]: 包含问题和答案的字典
         """
         config = self.table_config["shenhuifu"]
-        query = f"""
-            SELECT {config['questions_column']}, {config['answers_column']}
-            FROM {config['table']}
-            ORDER BY RANDOM()
-            LIMIT 1
-        """
 
         try:
-            result = await self._fetch_one(query)
+            if self.memory_store:
+                return (await self._get_memory_store()).pick_shenhuifu()
+
+            result = await self._fetch_random_row(
+                config['table'], [config['questions_column'], config['answers_column']]
+            )
             if not result:
                 return None
 
@@ -245,10 +829,12 @@ class DatabaseManager:
             Optional[str]: 图片URL
         """
         config = self.table_config["beauty_pic"]
-        query = f"SELECT {config['content_column']} FROM {config['table']} ORDER BY RANDOM() LIMIT 1"
 
         try:
-            result = await self._fetch_one(query)
+            if self.memory_store:
+                return (await self._get_memory_store()).pick("beauty_pic")
+
+            result = await self._fetch_random_row(config['table'], [config['content_column']])
             return result[config['content_column']] if result else None
         except Exception as e:
             logger.error(f"Error getting random beauty pic URL: {e}")
@@ -263,29 +849,42 @@ class DatabaseManager:
         Returns:
             Dict[str, List[str]]: 命令到内容列表的映射
         """
+        if self.memory_store:
+            store = await self._get_memory_store()
+            return {command: store.sample(command, batch_size)
+                    for command in commands if command in self.table_config}
+
         results = {}
-        async with self.pool.acquire() as conn:
+        async with self.acquire() as conn:
             for command in commands:
                 try:
                     config = self.table_config.get(command)
                     if not config:
                         continue
 
+                    # 在内存中抽取不重复的rowid，按主键批量取出
+                    table, content_column, process_br = self._content_source(config)
+                    index = await self._get_index(conn, table)
+                    rowids = index.sample(batch_size)
+                    if not rowids:
+                        results[command] = []
+                        continue
+
+                    placeholders = ", ".join("?" * len(rowids))
                     query = f"""
-                        SELECT {config['content_column']} 
-                        FROM {config['table']} 
-                        ORDER BY RANDOM() 
-                        LIMIT {batch_size}
+                        SELECT {content_column}
+                        FROM {table}
+                        WHERE rowid IN ({placeholders})
                     """
 
-                    contents = []
-                    async with conn.execute(query) as cursor:
-                        async for row in cursor:
-                            content = row[0]
-                            if config.get('process_br', False):
-                                content = self._process_text(content)
-                            contents.append(content)
+                    async with conn.execute(query, rowids) as cursor:
+                        rows = await cursor.fetchall()
+                    if process_br:
+                        contents = [self._process_text(row[0]) for row in rows]
+                    else:
+                        contents = [row[0] for row in rows]
 
+                    random.shuffle(contents)  # IN查询按rowid顺序返回，打乱以保持随机
                     results[command] = contents
                 except Exception as e:
                     logger.error(f"Error in batch getting content for {command}: {e}")
@@ -293,24 +892,45 @@ class DatabaseManager:
 
         return results
 
+    async def batch_get_random_shenhuifu(self, batch_size: int = 10) -> List[Dict[str, str]]:
+        """批量获取随机神回复
+        Args:
+            batch_size: 获取的数量
+        Returns:
+            List[Dict[str, str]]: 包含问题和答案的字典列表
+        """
+        config = self.table_config["shenhuifu"]
+        try:
+            if self.memory_store:
+                return (await self._get_memory_store()).sample_shenhuifu(batch_size)
+
+            async with self.acquire() as conn:
+                index = await self._get_index(conn, config['table'])
+                rowids = index.sample(batch_size)
+                if not rowids:
+                    return []
+
+                placeholders = ", ".join("?" * len(rowids))
+                query = f"""
+                    SELECT {config['questions_column']}, {config['answers_column']}
+                    FROM {config['table']}
+                    WHERE rowid IN ({placeholders})
+                """
+                async with conn.execute(query, rowids) as cursor:
+                    rows = await cursor.fetchall()
+
+            results = [{"question": row[0], "answer": row[1]} for row in rows]
+            random.shuffle(results)
+            return results
+        except Exception as e:
+            logger.error(f"Error in batch getting shenhuifu: {e}")
+            return []
+
     async def close(self):
         """关闭数据库连接池"""
         await self.pool.close_all()
+        self._ready = False
 
 
-# 创建数据库管理器实例
+# 创建数据库管理器实例（不进行任何文件或数据库操作，启动后在后台预热）
 db_manager = DatabaseManager()
-
-# 确保程序退出时关闭连接池
-import atexit
-import asyncio
-
-
-def cleanup_db():
-    """清理数据库连接"""
-    loop = asyncio.get_event_loop()
-    if not loop.is_closed():
-        loop.run_until_complete(db_manager.close())
-
-
-atexit.register(cleanup_db)
\ No newline at end of file
@@ -1,56 +1,52 @@
-from io import BytesIO
-from typing import TypedDict
+import asyncio
+from typing import Optional
 
-from nonebot import on_command, logger, get_bot
+from nonebot import get_driver, on_command, on_message, on_notice, logger
 from nonebot.adapters.onebot.v11 import (
-    MessageSegment, Message, MessageEvent, GroupMessageEvent
+    Bot, MessageSegment, Message, MessageEvent, GroupMessageEvent, NoticeEvent
 )
 from nonebot.matcher import Matcher
 from nonebot.params import CommandArg
+from nonebot.typing import T_State
 from nonebot.permission import SUPERUSER
 from nonebot.adapters.onebot.v11.permission import GROUP_ADMIN, GROUP_OWNER
 
 from .utils import utils
 from .api import api
+from .commands import COMMANDS, MAIN_ALIASES, find_command, resolve_command
+from .cache import TTLCache
+from .cooldown import cooldowns
+from .ratelimit import rate_limit
+from .router import bot_router
 from .config import plugin_config
 from .scheduler import scheduler_instance as scheduler
 from .response_handler import response_handler
 
 
-class CommandConfig(TypedDict):
-    """命令配置的类型定义
-    Attributes:
-        aliases: 命令别名元组，包含(主别名, [其他别名列表])
-        allow_args: 是否允许命令带参数
-    """
-    aliases: tuple[str, list[str]]  # (主别名, [其他别名列表])
-    allow_args: bool  # 是否允许命令带参数
-
-# 定义命令及其别名配置
-COMMANDS: dict[str, CommandConfig] = {
-    "hitokoto": {"aliases": ("一言", []), "allow_args": False},
-    "twq": {"aliases": ("土味情话", ["情话", "土味"]), "allow_args": False},
-    "dog": {"aliases": ("舔狗日记", ["dog", "舔狗"]), "allow_args": False},
-    "renjian": {"aliases": ("人间凑数", []), "allow_args": False},
-    "weibo_hot": {"aliases": ("微博热搜", ["微博"]), "allow_args": False},
-    "douyin_hot": {"aliases": ("抖音热搜", ["抖音"]), "allow_args": False},
-    "aiqinggongyu": {"aliases": ("爱情公寓", []), "allow_args": False},
-    "beauty_pic": {"aliases": ("随机美女", ["美女"]), "allow_args": False},
-    "cp": {"aliases": ("cp", ["宇宙cp"]), "allow_args": True},
-    "shenhuifu": {"aliases": ("神回复", ["神评"]), "allow_args": False},
-    "joke": {"aliases": ("讲个笑话", ["笑话"]), "allow_args": False},
-}
+# 命令前缀（COMMAND_START），按长度从长到短匹配
+COMMAND_STARTS = sorted(get_driver().config.command_start, key=len, reverse=True)
+
+# 分发器在 state 中保存解析结果的键
+COMMAND_STATE_KEY = "fun_content_command"
+COMMAND_ARG_STATE_KEY = "fun_content_command_arg"
+
+# 会使群成员显示名称失效的通知类型（group_card 为 go-cqhttp 等实现的扩展事件）
+MEMBER_CHANGE_NOTICES = {"group_increase", "group_decrease", "group_card"}
+
+# 群成员显示名称缓存：(群号, QQ号) -> 名称
+member_name_cache: TTLCache[str] = TTLCache(
+    ttl=plugin_config.fun_content_member_name_ttl,
+    maxsize=plugin_config.fun_content_member_name_cache_size,
+)
 
 
 def register_handlers():
     """注册所有的命令处理器
     - 包括普通功能命令、管理命令和定时任务命令
     """
-    # 注册普通功能命令
-    for cmd, info in COMMANDS.items():
-        main_alias, other_aliases = info["aliases"]
-        matcher = on_command(main_alias, aliases=set(other_aliases), priority=5)
-        matcher.handle()(handle_command(cmd))
+    # 注册普通功能命令 - 所有命令共用一个分发器，由别名索引解析具体命令
+    command_dispatcher = on_message(rule=_match_fun_command, priority=5, block=True)
+    command_dispatcher.handle()(handle_command)
 
     # 注册管理命令 - 群组功能开关控制
     enable_cmd = on_command("开启",
@@ -82,92 +78,135 @@ def register_handlers():
     schedule_status_cmd.handle()(handle_schedule_status)
     disable_schedule_cmd.handle()(handle_disable_schedule)
 
+    # 注册群成员变动通知 - 清除成员名称缓存
+    member_change_notice = on_notice(rule=_is_member_change, priority=1, block=False)
+    member_change_notice.handle()(handle_member_change)
 
-def is_strict_command_match(command: str, user_input: str) -> bool:
-    """严格匹配指令
-    - 检查用户输入是否完全匹配命令别名
-    - 区分是否允许带参数的命令匹配规则
-    """
-    main_alias, other_aliases = COMMANDS[command]["aliases"]
-    all_aliases = [main_alias] + other_aliases
-    allow_args = COMMANDS[command]["allow_args"]
 
-    if allow_args:
-        return any(user_input.strip().lower().startswith(alias.lower()) for alias in all_aliases)
+def _is_member_change(event: NoticeEvent) -> bool:
+    """判断是否为群成员变动通知"""
+    return event.notice_type in MEMBER_CHANGE_NOTICES
+
+
+def _strip_command_start(text: str) -> Optional[str]:
+    """去掉命令前缀，没有匹配的前缀时返回None"""
+    for start in COMMAND_STARTS:
+        if text.startswith(start):
+            return text[len(start):]
+    return None
+
+
+def _match_fun_command(event: MessageEvent, state: T_State) -> bool:
+    """分发器匹配规则
+    - 去掉命令前缀后通过别名索引解析命令，不是命令的消息直接忽略
+    - 不允许带参数的命令必须与别名完全一致；允许带参数的命令匹配别名前缀，其余部分作为参数
+    """
+    message = event.get_message()
+    if not message or not message[0].is_text():
+        return False
+
+    text = _strip_command_start(event.get_plaintext().strip())
+    if text is None:
+        return False
+    matched = resolve_command(text)
+    if matched is None:
+        return False
+
+    command, alias_length = matched
+    command_arg = message.copy()
+    command_arg.pop(0)
+    if COMMANDS[command]["allow_args"]:
+        # 从第一个文本段中去掉命令前缀和别名，剩余内容与后续消息段组成参数
+        segment_text = _strip_command_start(message[0].data["text"].lstrip()) or ""
+        rest = segment_text[alias_length:].lstrip()
+        if rest:
+            command_arg.insert(0, MessageSegment.text(rest))
     else:
-        return any(user_input.strip().lower() == alias.lower() for alias in all_aliases)
+        command_arg = Message()
+
+    state[COMMAND_STATE_KEY] = command
+    state[COMMAND_ARG_STATE_KEY] = command_arg
+    return True
 
 
-def handle_command(command: str):
-    """返回命令处理函数闭包
-    - 用于处理具体的功能命令逻辑
+async def handle_command(matcher: Matcher, bot: Bot, event: MessageEvent, state: T_State):
+    """处理功能命令
+    - 命令和参数由分发器的匹配规则解析
     - 包含冷却检查、权限控制和结果发送
     """
-    async def handler(matcher: Matcher, event: MessageEvent, args: Message = CommandArg()):
-        user_input = event.get_plaintext().strip()
+    command: str = state[COMMAND_STATE_KEY]
+    args: Message = state[COMMAND_ARG_STATE_KEY]
+
+    # 检查群组功能权限
+    if isinstance(event, GroupMessageEvent):
+        group_id = str(event.group_id)
+        if not utils.is_function_enabled(group_id, command):
+            logger.info(f"Function {command} is disabled in group {group_id}")
+            await matcher.finish(f"该功能在本群已被禁用")
+
+    user_id = str(event.user_id)
+    group_id = str(event.group_id) if isinstance(event, GroupMessageEvent) else "private"
+
+    # 先查看全局和群组级令牌（不扣除），令牌耗尽时直接丢弃，不进行冷却后端的读写
+    limit_key = str(event.group_id) if isinstance(event, GroupMessageEvent) else f"private_{event.user_id}"
+    limited_by = rate_limit.peek(limit_key)
+    if limited_by:
+        logger.info(f"Command {command} dropped by {limited_by} rate limit ({limit_key})")
+        await matcher.finish()
+
+    # 检查冷却时间，防止滥用；先于扣除令牌，冷却中的重复请求不消耗群组和全局的令牌
+    cooldown = plugin_config.fun_content_cooldowns.get(command, 20)
+    remaining_cd = await cooldowns.acquire(command, user_id, group_id, cooldown)
+    if remaining_cd > 0:
+        logger.info(f"Command {command} is in cooldown for user {user_id} in group {group_id}")
+        await matcher.finish(f"指令冷却中，请等待 {int(remaining_cd)} 秒再试喵~")
+
+    # 扣除令牌，超出限制的请求在查询数据库和请求API之前直接丢弃（同时撤销本次冷却）
+    limited_by = rate_limit.try_acquire(limit_key, command)
+    if limited_by:
+        await cooldowns.release(command, user_id, group_id)
+        logger.info(f"Command {command} dropped by {limited_by} rate limit ({limit_key})")
+        await matcher.finish()
+
+    command_args = await _process_command_args(command, bot, event, args)
+    # 检查命令参数合法性
+    if not COMMANDS[command]["allow_args"] and command_args:
+        await cooldowns.release(command, user_id, group_id)
+        await matcher.finish()
+
+    try:
+        # 不同类型命令的处理逻辑
+        if command == "cp":
+            # 处理CP图片生成命令
+            image = await api.get_cp_content(command_args)
+            try:
+                await matcher.send(MessageSegment.image(image))
+            except Exception as e:
+                error_msg = response_handler.format_error(e, command)
+                logger.error(f"Failed to send image for CP command: {error_msg}")
+                await matcher.send("CP图片生成成功，但发送失败。请稍后再试。")
 
-        # 严格匹配指令，避免模糊触发
-        if not is_strict_command_match(command, user_input):
-            await matcher.finish()
+        elif command == "beauty_pic":
+            # 处理随机美女图片命令
+            try:
+                image_url = await api.get_content(command)
+                await matcher.send(MessageSegment.image(image_url))
+            except Exception as e:
+                error_msg = response_handler.format_error(e, command)
+                logger.error(f"Failed to send beauty pic: {error_msg}")
+                await matcher.send("图片获取失败，请稍后再试。")
 
-        # 检查群组功能权限
-        if isinstance(event, GroupMessageEvent):
-            group_id = str(event.group_id)
-            if not utils.is_function_enabled(group_id, command):
-                logger.info(f"Function {command} is disabled in group {group_id}")
-                await matcher.finish(f"该功能在本群已被禁用")
-
-        command_args = await _process_command_args(command, event, args)
-        # 检查命令参数合法性
-        if not COMMANDS[command]["allow_args"] and command_args:
-            await matcher.finish()
-
-        user_id = str(event.user_id)
-        group_id = str(event.group_id) if isinstance(event, GroupMessageEvent) else "private"
-
-        # 检查冷却时间，防止滥用
-        cooldown = plugin_config.fun_content_cooldowns.get(command, 20)
-        if utils.is_in_cooldown(command, user_id, group_id):
-            remaining_cd = utils.get_cooldown_time(command, user_id, group_id)
-            logger.info(f"Command {command} is in cooldown for user {user_id} in group {group_id}")
-            await matcher.finish(f"指令冷却中，请等待 {int(remaining_cd)} 秒再试喵~")
-
-        try:
-            # 不同类型命令的处理逻辑
-            if command == "cp":
-                # 处理CP图片生成命令
-                image_data = await api.get_cp_content(command_args)
-                try:
-                    await matcher.send(MessageSegment.image(BytesIO(image_data)))
-                except Exception as e:
-                    error_msg = response_handler.format_error(e, command)
-                    logger.error(f"Failed to send image for CP command: {error_msg}")
-                    await matcher.send("CP图片生成成功，但发送失败。请稍后再试。")
-
-            elif command == "beauty_pic":
-                # 处理随机美女图片命令
-                try:
-                    image_url = await api.get_content(command)
-                    await matcher.send(MessageSegment.image(image_url))
-                except Exception as e:
-                    error_msg = response_handler.format_error(e, command)
-                    logger.error(f"Failed to send beauty pic: {error_msg}")
-                    await matcher.send("图片获取失败，请稍后再试。")
-
-            else:
-                # 处理文本类命令
-                result = await api.get_content(command)
-                await matcher.send(result)
-
-            # 设置命令冷却时间
-            utils.set_cooldown(command, user_id, group_id, cooldown)
-
-        except Exception as e:
-            error_msg = response_handler.format_error(e, command)
-            logger.error(f"Error in command {command}: {error_msg}")
-            await matcher.send(error_msg)
-
-    return handler
+        else:
+            # 处理文本类命令
+            result = await api.get_content(command)
+            await matcher.send(result)
+
+    except Exception as e:
+        # 命令执行失败，撤销本次冷却
+        await cooldowns.release(command, user_id, group_id)
+        error_msg = response_handler.format_error(e, command)
+        logger.error(f"Error in command {command}: {error_msg}")
+        await matcher.send(error_msg)
 
 
 async def handle_enable(matcher: Matcher, event: GroupMessageEvent, args: Message = CommandArg()):
@@ -179,13 +218,11 @@ async def handle_enable(matcher: Matcher, event: GroupMessageEvent, args: Messag
     group_id = str(event.group_id)
 
     # 查找并启用对应功能
-    for cmd, info in COMMANDS.items():
-        main_alias, other_aliases = info["aliases"]
-        if function == main_alias or function in other_aliases:
-            utils.enable_function(group_id, cmd)
-            await matcher.finish(f"{main_alias}已启用。")
-
-    await matcher.finish(f"未找到名为 '{function}' 的功能。")
+    cmd = find_command(function)
+    if cmd is None:
+        await matcher.finish(f"未找到名为 '{function}' 的功能。")
+    utils.enable_function(group_id, cmd)
+    await matcher.finish(f"{MAIN_ALIASES[cmd]}已启用。")
 
 
 async def handle_disable(matcher: Matcher, event: GroupMessageEvent, args: Message = CommandArg()):
@@ -197,13 +234,11 @@ async def handle_disable(matcher: Matcher, event: GroupMessageEvent, args: Messa
     group_id = str(event.group_id)
 
     # 查找并禁用对应功能
-    for cmd, info in COMMANDS.items():
-        main_alias, other_aliases = info["aliases"]
-        if function == main_alias or function in other_aliases:
-            utils.disable_function(group_id, cmd)
-            await matcher.finish(f"{main_alias}已禁用。")
-
-    await matcher.finish(f"未找到名为 '{function}' 的功能。")
+    cmd = find_command(function)
+    if cmd is None:
+        await matcher.finish(f"未找到名为 '{function}' 的功能。")
+    utils.disable_function(group_id, cmd)
+    await matcher.finish(f"{MAIN_ALIASES[cmd]}已禁用。")
 
 
 async def handle_status(matcher: Matcher, event: GroupMessageEvent):
@@ -211,11 +246,11 @@ async def handle_status(matcher: Matcher, event: GroupMessageEvent):
     - 显示所有功能的启用/禁用状态
     """
     group_id = str(event.group_id)
-    status_messages = []
-    for cmd, info in COMMANDS.items():
-        main_alias, _ = info["aliases"]
-        status = "已启用" if utils.is_function_enabled(group_id, cmd) else "已禁用"
-        status_messages.append(f"{main_alias}: {status}")
+    switch_status = utils.get_switch_status(group_id)
+    status_messages = [
+        f"{MAIN_ALIASES[cmd]}: {'已启用' if switch_status.get(cmd, True) else '已禁用'}"
+        for cmd in COMMANDS
+    ]
 
     await matcher.finish("\n".join(status_messages))
 
@@ -229,15 +264,16 @@ async def handle_set_schedule(matcher: Matcher, event: GroupMessageEvent, args:
     command_args = args.extract_plain_text().strip().split()
     if len(command_args) == 2:
         function, time = command_args
-        for cmd, info in COMMANDS.items():
-            main_alias, other_aliases = info["aliases"]
-            if function == main_alias or function in other_aliases:
-                if utils.is_valid_time_format(time):
-                    scheduler.add_job(group_id, cmd, time)
-                    await matcher.finish(f"已设置 {main_alias} 在 {time} 定时触发。")
-                else:
-                    await matcher.finish("时间格式错误，请使用 HH:MM 格式。")
-        await matcher.finish(f"未找到名为 '{function}' 的功能。")
+        cmd = find_command(function)
+        if cmd is None:
+            await matcher.finish(f"未找到名为 '{function}' 的功能。")
+        time = scheduler.normalize_time(time)
+        if time is None:
+            await matcher.finish("时间格式错误，请使用 HH:MM 格式。")
+        if scheduler.add_job(group_id, cmd, time):
+            await matcher.finish(f"已设置 {MAIN_ALIASES[cmd]} 在 {time} 定时触发。")
+        else:
+            await matcher.finish(f"{MAIN_ALIASES[cmd]} 在 {time} 的定时任务已存在。")
     else:
         await matcher.finish("参数错误，请使用正确的格式：设置 [功能指令] [时间]")
 
@@ -251,7 +287,7 @@ async def handle_schedule_status(matcher: Matcher, event: GroupMessageEvent):
     if status:
         formatted_status = []
         for command, times in status.items():
-            main_alias = next((info["aliases"][0] for cmd, info in COMMANDS.items() if cmd == command), command)
+            main_alias = MAIN_ALIASES.get(command, command)
             for time in times:
                 formatted_status.append(f"{main_alias} 在 {time} 触发")
         await matcher.finish("\n".join(formatted_status))
@@ -270,49 +306,69 @@ async def handle_disable_schedule(matcher: Matcher, event: GroupMessageEvent, ar
         await matcher.finish("参数错误，请使用正确的格式：定时任务禁用 [功能指令] [时间]")
 
     function, time = command_args
-    for cmd, info in COMMANDS.items():
-        main_alias, other_aliases = info["aliases"]
-        if function == main_alias or function in other_aliases:
-            if utils.is_valid_time_format(time):
-                if scheduler.remove_job(group_id, cmd, time):
-                    await matcher.finish(f"已删除 {main_alias} 在 {time} 的定时任务。")
-                else:
-                    await matcher.finish(f"未找到 {main_alias} 在 {time} 的定时任务。")
-            else:
-                await matcher.finish("时间格式错误，请使用 HH:MM 格式。")
-
-    await matcher.finish(f"未找到名为 '{function}' 的功能。")
-
-async def _process_command_args(command, event, args: Message = CommandArg()):
+    cmd = find_command(function)
+    if cmd is None:
+        await matcher.finish(f"未找到名为 '{function}' 的功能。")
+    time = scheduler.normalize_time(time)
+    if time is None:
+        await matcher.finish("时间格式错误，请使用 HH:MM 格式。")
+
+    main_alias = MAIN_ALIASES[cmd]
+    if scheduler.remove_job(group_id, cmd, time):
+        await matcher.finish(f"已删除 {main_alias} 在 {time} 的定时任务。")
+    else:
+        await matcher.finish(f"未找到 {main_alias} 在 {time} 的定时任务。")
+
+async def _get_member_name(bot: Bot, group_id: int, qq: str) -> str:
+    """获取群成员显示名称（群名片优先，其次昵称）
+    - 使用收到消息的机器人查询，结果按 (群号, QQ号) 缓存，群成员变动时失效
+    - 获取失败时返回QQ号
+    """
+    key = (str(group_id), str(qq))
+    name = member_name_cache.get(key)
+    if name is not None:
+        return name
+
+    try:
+        member_info = await bot.get_group_member_info(group_id=group_id, user_id=qq)
+        name = member_info.get("card") or member_info.get("nickname", str(qq))
+        member_name_cache.set(key, name)
+        return name
+    except Exception as e:
+        logger.error(f"获取用户信息失败: {e}")
+        return str(qq)
+
+
+async def handle_member_change(event: NoticeEvent):
+    """群成员变动（入群、退群、群名片变更）时清除对应的名称缓存
+    - 机器人自身入群或退群时同时更新消息路由
+    """
+    group_id = getattr(event, "group_id", None)
+    user_id = getattr(event, "user_id", None)
+    if group_id is not None and user_id is not None:
+        member_name_cache.invalidate((str(group_id), str(user_id)))
+        if user_id == event.self_id:
+            if event.notice_type == "group_increase":
+                bot_router.add_group(str(event.self_id), str(group_id))
+            elif event.notice_type == "group_decrease":
+                bot_router.remove_group(str(event.self_id), str(group_id))
+
+
+async def _process_command_args(command, bot: Bot, event, args: Message = CommandArg()):
     """处理命令参数，严格返回两个名称，且只允许纯文本或纯@用户"""
     if command != "cp":
         return args.extract_plain_text().strip()
 
     has_text = False  # 是否包含文本段
-    has_at = False    # 是否包含@用户段
+    at_users = []     # 被@的用户QQ号
     names = []
-    
+
     for seg in args:
         # 处理@用户段
         if seg.type == "at":
             qq = seg.data.get("qq")
-            if not qq:
-                continue
-
-            try:
-                if isinstance(event, GroupMessageEvent):
-                    group_id = event.group_id
-                    bot = get_bot()
-                    member_info = await bot.get_group_member_info(group_id=group_id, user_id=qq)
-                    name = member_info.get("card") or member_info.get("nickname", str(qq))
-                else:
-                    name = str(qq)
-
-                names.append(name)
-                has_at = True
-            except Exception as e:
-                logger.error(f"获取用户信息失败: {e}")
-                names.append(str(qq))
+            if qq:
+                at_users.append(qq)
 
         # 处理文本段
         elif seg.type == "text":
@@ -322,8 +378,18 @@ async def _process_command_args(command, event, args: Message = CommandArg()):
                 has_text = True
 
     # 检查是否混用了文本和@用户
-    if has_text and has_at:
+    if has_text and at_users:
         return ""  # 混用了文本和@用户，返回空字符串
 
+    if at_users:
+        # 不是恰好两个@用户时无需查询名称
+        if len(at_users) != 2:
+            return ""
+        if isinstance(event, GroupMessageEvent):
+            # 并发查询两个成员的名称
+            names = list(await asyncio.gather(*(_get_member_name(bot, event.group_id, qq) for qq in at_users)))
+        else:
+            names = [str(qq) for qq in at_users]
+
     # 严格返回两个名称，否则返回空字符串
-    return " ".join(names[:2]) if len(names) == 2 else ""
\ No newline at end of file
+    return " ".join(names[:2]) if len(names) == 2 else ""
@@ -0,0 +1,71 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+from .config import plugin_config
+
+
+class SendPacer:
+    """消息发送节流
+    - 所有发送按先后顺序排队，相邻两次发送的间隔不小于 1/rate 秒（rate 为0时不限速）
+    - 同时等待适配器返回的发送请求不超过 max_inflight 个，适配器变慢时后续发送随之等待
+    - 记录每条消息从任务触发到实际发送的等待时间
+    """
+    # 用于计算等待时间分位数的最近样本数
+    SAMPLE_SIZE = 1000
+
+    def __init__(self, rate: float, max_inflight: int):
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self._next_send = 0.0  # 下一次允许发送的时间（monotonic）
+        self._order_lock = asyncio.Lock()  # 保证按排队顺序发送
+        self._inflight = asyncio.Semaphore(max(1, max_inflight))
+        self._waits: Deque[float] = deque(maxlen=self.SAMPLE_SIZE)
+        self.sent = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @asynccontextmanager
+    async def slot(self, queued_at: Optional[float] = None) -> AsyncIterator[None]:
+        """获取一次发送机会
+        Args:
+            queued_at: 任务触发时间（monotonic），用于统计等待时间，不提供时从调用时开始计算
+        """
+        if queued_at is None:
+            queued_at = time.monotonic()
+
+        await self._inflight.acquire()
+        try:
+            async with self._order_lock:
+                delay = self._next_send - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self._next_send = time.monotonic() + self.interval
+            self._record(time.monotonic() - queued_at)
+            yield
+        finally:
+            self._inflight.release()
+
+    def _record(self, wait: float):
+        self.sent += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self._waits.append(wait)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取发送等待时间统计（秒）"""
+        waits = sorted(self._waits)
+        return {
+            "sent": self.sent,
+            "avg_wait": self.total_wait / self.sent if self.sent else 0.0,
+            "max_wait": self.max_wait,
+            "p95_wait": waits[int(len(waits) * 0.95) - 1] if waits else 0.0,
+        }
+
+
+# 创建定时消息发送节流实例
+send_pacer = SendPacer(
+    plugin_config.fun_content_schedule_send_rate,
+    plugin_config.fun_content_schedule_send_max_inflight,
+)
@@ -0,0 +1,319 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+import aiosqlite
+
+from nonebot import logger
+
+
+# 进程的文件创建掩码（导入时读取一次，os.umask 只能通过设置来读取，不是线程安全的）
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def copy_tree(data: Any) -> Any:
+    """复制由字典和列表组成的数据结构（叶子节点为不可变值），用于在事件循环中生成一致的快照"""
+    if isinstance(data, dict):
+        return {key: copy_tree(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [copy_tree(item) for item in data]
+    return data
+
+
+def write_json_atomic(path: Path, data: Any) -> None:
+    """原子写入JSON文件
+    - 先写入同目录下的临时文件并 fsync，再通过 rename 替换目标文件
+    - 写入过程中崩溃不会留下不完整的文件
+    - 临时文件沿用目标文件的权限（目标文件不存在时按 umask 设置），避免 mkstemp 的 0600 权限被带到目标文件
+    Args:
+        path: 目标文件路径
+        data: 要保存的数据，在线程中调用时需传入快照，不能与事件循环共享
+    """
+    text = json.dumps(data, indent=2, ensure_ascii=False)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        if path.exists():
+            shutil.copymode(path, tmp_path)
+        else:
+            os.chmod(tmp_path, 0o666 & ~_UMASK)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    # 同步目录项，确保 rename 本身也已落盘（Windows 不支持打开目录）
+    if hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(path.parent, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class DebouncedJsonWriter:
+    """延迟合并写入的JSON持久化器
+    - 数据变更后只做标记，delay 秒内的多次变更合并为一次写入
+    - 在事件循环中复制一份一致的快照，序列化和文件写入在线程中完成
+    - 写入是原子的，关闭时通过 flush 写入尚未保存的变更
+    """
+    def __init__(self, path: Path, snapshot: Callable[[], Dict[str, Any]], delay: float = 1.0):
+        self.path = path
+        self.delay = delay
+        self._snapshot = snapshot  # 返回当前要保存的数据
+        self._dirty = False
+        self._pending: Optional[asyncio.Task] = None  # 等待中的延迟写入任务
+        self._write_lock = asyncio.Lock()  # 保证同一时间只有一个写入
+
+    def write_sync(self, data: Optional[Dict[str, Any]] = None) -> None:
+        """立即同步写入（用于事件循环启动前）"""
+        write_json_atomic(self.path, self._snapshot() if data is None else data)
+
+    def schedule(self) -> None:
+        """标记数据已变更，在 delay 秒后写入"""
+        self._dirty = True
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # 没有运行中的事件循环，直接同步写入
+            self._dirty = False
+            self.write_sync()
+            return
+
+        if self._pending is None or self._pending.done():
+            self._pending = asyncio.create_task(self._delayed_write())
+
+    async def _delayed_write(self) -> None:
+        await asyncio.sleep(self.delay)
+        # 写入开始后不再响应取消，避免与 flush 的写入交错
+        await asyncio.shield(self._write())
+
+    async def _write(self) -> None:
+        async with self._write_lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            snapshot = copy_tree(self._snapshot())
+            try:
+                await asyncio.to_thread(write_json_atomic, self.path, snapshot)
+                logger.debug(f"成功保存持久化数据: {self.path}")
+            except Exception as e:
+                self._dirty = True  # 保留变更标记，下次写入时重试
+                logger.error(f"保存数据失败: {e}")
+
+    async def flush(self) -> None:
+        """立即写入所有尚未保存的变更"""
+        if self._pending is not None and not self._pending.done():
+            self._pending.cancel()
+            try:
+                await self._pending
+            except asyncio.CancelledError:
+                pass
+        self._pending = None
+        await self._write()
+
+
+class JsonStateStore:
+    """JSON文件状态存储（默认后端）
+    - 群组开关和定时任务保存在同一个JSON文件中
+    - 任何变更都会触发整份数据的延迟合并写入
+    """
+    def __init__(self, path: Path, snapshot: Callable[[], Dict[str, Any]], delay: float = 1.0):
+        self._writer = DebouncedJsonWriter(path, snapshot, delay=delay)
+
+    def write_sync(self, data: Optional[Dict[str, Any]] = None) -> None:
+        self._writer.write_sync(data)
+
+    def switch_changed(self, group_id: str, command: str, enabled: bool) -> None:
+        self._writer.schedule()
+
+    def schedule_added(self, group_id: str, command: str, time_str: str) -> None:
+        self._writer.schedule()
+
+    def schedule_removed(self, group_id: str, command: str, time_str: str) -> None:
+        self._writer.schedule()
+
+    def save_all(self) -> None:
+        self._writer.schedule()
+
+    async def flush(self) -> None:
+        await self._writer.flush()
+
+    async def close(self) -> None:
+        await self._writer.flush()
+
+
+class SqliteStateStore:
+    """SQLite状态存储
+    - 群组开关和定时任务分别保存在带主键的表中，定时任务按 (时间, 命令) 建有索引
+    - 开关表只保存被禁用的命令
+    - 每次变更只写入对应的行，同一时刻的多次变更在后台合并为一个事务
+    - 首次启动时可从原有的JSON文件一次性迁移数据
+    """
+    SCHEMA = (
+        """CREATE TABLE IF NOT EXISTS group_switches (
+            group_id TEXT NOT NULL,
+            command TEXT NOT NULL,
+            enabled INTEGER NOT NULL,
+            PRIMARY KEY (group_id, command)
+        ) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS group_schedules (
+            group_id TEXT NOT NULL,
+            command TEXT NOT NULL,
+            time TEXT NOT NULL,
+            PRIMARY KEY (group_id, command, time)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_group_schedules_time ON group_schedules (time, command)",
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    )
+    UPSERT_SWITCH = (
+        "INSERT INTO group_switches (group_id, command, enabled) VALUES (?, ?, ?) "
+        "ON CONFLICT (group_id, command) DO UPDATE SET enabled = excluded.enabled"
+    )
+    DELETE_SWITCH = "DELETE FROM group_switches WHERE group_id = ? AND command = ?"
+    INSERT_SCHEDULE = "INSERT OR IGNORE INTO group_schedules (group_id, command, time) VALUES (?, ?, ?)"
+    DELETE_SCHEDULE = "DELETE FROM group_schedules WHERE group_id = ? AND command = ? AND time = ?"
+
+    def __init__(self, db_path: Path, snapshot: Callable[[], Dict[str, Any]],
+                 switch_key: str, scheduled_key: str):
+        self.db_path = db_path
+        self._snapshot = snapshot  # 返回当前完整数据，用于 save_all
+        self.switch_key = switch_key
+        self.scheduled_key = scheduled_key
+        self._conn: Optional[aiosqlite.Connection] = None
+        self._ops = []  # 待写入的 (SQL, 参数) 列表
+        self._pending: Optional[asyncio.Task] = None
+
+    async def open(self) -> None:
+        """打开数据库并创建表结构"""
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = await aiosqlite.connect(self.db_path)
+        await self._conn.execute("PRAGMA journal_mode=WAL")
+        await self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in self.SCHEMA:
+            await self._conn.execute(statement)
+        await self._conn.commit()
+
+    async def migrate_from_json(self, json_path: Path) -> bool:
+        """从JSON文件一次性迁移数据（迁移完成后记录在 meta 表中，不会重复执行）
+        - JSON文件无法读取或解析时记录错误并跳过迁移（同样记录为已完成），不影响读取数据库中已有的数据
+        Returns:
+            bool: 是否进行了迁移
+        """
+        async with self._conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'") as cursor:
+            if await cursor.fetchone():
+                return False
+
+        data = {}
+        if await asyncio.to_thread(json_path.exists):
+            try:
+                data = json.loads(await asyncio.to_thread(json_path.read_text, encoding="utf-8"))
+                if not isinstance(data, dict):
+                    raise ValueError("top-level value is not an object")
+            except (OSError, ValueError) as e:
+                logger.error(f"JSON文件无法读取，跳过迁移: {json_path} ({e})")
+                data = {}
+
+        switches = [
+            (str(group_id), command, 0)
+            for group_id, commands in data.get(self.switch_key, {}).items()
+            for command, enabled in commands.items()
+            if not enabled
+        ]
+        schedules = [
+            (str(group_id), command, time_str)
+            for group_id, commands in data.get(self.scheduled_key, {}).items()
+            for command, times in commands.items()
+            for time_str in times
+        ]
+        await self._conn.executemany(self.UPSERT_SWITCH, switches)
+        await self._conn.executemany(self.INSERT_SCHEDULE, schedules)
+        await self._conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', ?)", (str(json_path),)
+        )
+        await self._conn.commit()
+        if data:
+            logger.success(f"已从 {json_path} 迁移 {len(switches)} 条开关和 {len(schedules)} 条定时任务")
+        return bool(data)
+
+    async def load(self) -> Dict[str, Any]:
+        """读取全部数据，结构与JSON文件相同"""
+        data: Dict[str, Any] = {self.switch_key: {}, self.scheduled_key: {}}
+        async with self._conn.execute("SELECT group_id, command, enabled FROM group_switches") as cursor:
+            for group_id, command, enabled in await cursor.fetchall():
+                data[self.switch_key].setdefault(group_id, {})[command] = bool(enabled)
+        async with self._conn.execute(
+            "SELECT group_id, command, time FROM group_schedules ORDER BY group_id, command, time"
+        ) as cursor:
+            for group_id, command, time_str in await cursor.fetchall():
+                data[self.scheduled_key].setdefault(group_id, {}).setdefault(command, []).append(time_str)
+        return data
+
+    def _enqueue(self, sql: str, params: tuple) -> None:
+        """加入待写入队列，并确保有后台任务负责写入"""
+        self._ops.append((sql, params))
+        if self._pending is None or self._pending.done():
+            self._pending = asyncio.create_task(self._drain())
+
+    async def _drain(self) -> None:
+        """在一个事务中写入队列中的所有变更"""
+        while self._ops and self._conn is not None:
+            ops, self._ops = self._ops, []
+            try:
+                for sql, params in ops:
+                    await self._conn.execute(sql, params)
+                await self._conn.commit()
+            except Exception as e:
+                logger.error(f"保存数据失败: {e}")
+                await self._conn.rollback()
+
+    def switch_changed(self, group_id: str, command: str, enabled: bool) -> None:
+        # 只保存被禁用的命令，重新启用时删除对应的行
+        if enabled:
+            self._enqueue(self.DELETE_SWITCH, (group_id, command))
+        else:
+            self._enqueue(self.UPSERT_SWITCH, (group_id, command, 0))
+
+    def schedule_added(self, group_id: str, command: str, time_str: str) -> None:
+        self._enqueue(self.INSERT_SCHEDULE, (group_id, command, time_str))
+
+    def schedule_removed(self, group_id: str, command: str, time_str: str) -> None:
+        self._enqueue(self.DELETE_SCHEDULE, (group_id, command, time_str))
+
+    def save_all(self) -> None:
+        """用当前完整数据覆盖数据库内容"""
+        data = self._snapshot()
+        self._enqueue("DELETE FROM group_switches", ())
+        self._enqueue("DELETE FROM group_schedules", ())
+        for group_id, commands in data.get(self.switch_key, {}).items():
+            for command, enabled in commands.items():
+                if not enabled:
+                    self._enqueue(self.UPSERT_SWITCH, (group_id, command, 0))
+        for group_id, commands in data.get(self.scheduled_key, {}).items():
+            for command, times in commands.items():
+                for time_str in times:
+                    self._enqueue(self.INSERT_SCHEDULE, (group_id, command, time_str))
+
+    async def flush(self) -> None:
+        """等待所有变更写入完成"""
+        if self._pending is not None:
+            await self._pending
+        await self._drain()
+
+    async def close(self) -> None:
+        await self.flush()
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
@@ -0,0 +1,109 @@
+import asyncio
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from nonebot import logger
+from .config import plugin_config
+from .database import db_manager
+from .response_handler import response_handler
+
+
+class ContentBuffer:
+    """内容预取缓冲区
+    - 为每个本地数据库命令预先取出一批已处理好的内容
+    - 请求路径只从缓冲区弹出，不再等待数据库查询
+    - 剩余条数低于低水位时，由后台任务一次性批量补充
+    """
+    # 出错后再次尝试补充前的等待时间（秒）
+    RETRY_DELAY = 5.0
+
+    def __init__(self, commands: List[str], size: int, low_water: int):
+        self.size = size
+        self.low_water = min(low_water, size)
+        self._buffers: Dict[str, Deque[str]] = {cmd: deque(maxlen=size) for cmd in commands}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def pop(self, command: str) -> Optional[str]:
+        """从缓冲区弹出一条内容
+        Args:
+            command: 命令名称
+        Returns:
+            Optional[str]: 预取的内容，缓冲区为空或命令未启用预取时返回None
+        """
+        buffer = self._buffers.get(command)
+        if buffer is None or not self.enabled:
+            return None
+
+        item = buffer.popleft() if buffer else None
+        if len(buffer) < self.low_water:
+            self._wakeup.set()  # 通知后台任务补充
+        return item
+
+    def start(self):
+        """启动后台补充任务，首次运行即填满所有缓冲区"""
+        if not self.enabled or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    async def close(self):
+        """停止后台补充任务并清空缓冲区"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for buffer in self._buffers.values():
+            buffer.clear()
+
+    async def _run(self):
+        """后台补充循环"""
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            pending = [cmd for cmd, buffer in self._buffers.items() if len(buffer) < self.low_water]
+            if not pending:
+                continue
+
+            try:
+                fetched = await self._fetch(pending)
+            except Exception as e:
+                logger.error(f"Content prefetch failed: {e}")
+                fetched = {}
+
+            for cmd, items in fetched.items():
+                buffer = self._buffers[cmd]
+                buffer.extend(items[:self.size - len(buffer)])
+
+            # 有命令未取到内容（数据库异常或数据表为空）时延迟后再试，避免频繁查询
+            if any(not self._buffers[cmd] for cmd in pending):
+                await asyncio.sleep(self.RETRY_DELAY)
+
+    async def _fetch(self, commands: List[str]) -> Dict[str, List[str]]:
+        """批量取出内容，神回复单独查询并格式化为问答文本"""
+        results: Dict[str, List[str]] = {}
+        content_commands = [cmd for cmd in commands if cmd != "shenhuifu"]
+        if content_commands:
+            results.update(await db_manager.batch_get_random_content(content_commands, self.size))
+        if "shenhuifu" in commands:
+            results["shenhuifu"] = [
+                response_handler.format_shenhuifu(item)
+                for item in await db_manager.batch_get_random_shenhuifu(self.size)
+            ]
+        return results
+
+
+# 创建内容预取缓冲区实例（内存模式下选取本身没有I/O，无需预取）
+content_buffer = ContentBuffer(
+    plugin_config.DATABASE_SUPPORTED_COMMANDS,
+    0 if db_manager.memory_store else plugin_config.fun_content_prefetch_size,
+    plugin_config.fun_content_prefetch_low_water,
+)
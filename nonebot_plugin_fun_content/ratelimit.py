@@ -0,0 +1,154 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from .config import plugin_config
+
+
+class TokenBucket:
+    """令牌桶
+    - 以 rate 个/秒的速度补充令牌，最多积累 burst 个
+    - 每次请求消耗一个令牌
+    """
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def refill(self, now: float) -> float:
+        """补充令牌并返回当前令牌数"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+
+
+class RateLimiter:
+    """按键分组的令牌桶限流器
+    - 每个键（如群组或命令）拥有独立的令牌桶，rate 为0时不限流
+    - 令牌桶数超过 max_buckets 时淘汰最久未使用的桶（相当于重置为满桶）
+    - 记录放行和拒绝次数
+    """
+    def __init__(self, name: str, rate: float, burst: float, max_buckets: int = 10000):
+        self.name = name
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+        self.allowed = 0
+        self.rejected = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def bucket(self, key: Hashable, now: float) -> Optional[TokenBucket]:
+        """获取并补充键对应的令牌桶，未启用限流时返回None"""
+        if not self.enabled:
+            return None
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst, now)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket.refill(now)
+        return bucket
+
+    def stats(self) -> Dict[str, Any]:
+        """获取限流统计数据"""
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "buckets": len(self._buckets),
+        }
+
+
+class RateLimit:
+    """全局、群组、命令三级限流
+    - 请求需要在每一级都有可用令牌才会放行，放行时各级同时扣除一个令牌
+    - 任意一级没有令牌时直接拒绝，不扣除其他级的令牌
+    - 只涉及内存计算，可在数据库查询和网络请求之前调用
+    """
+    def __init__(self, limits: Dict[str, Dict[str, float]]):
+        def create(name: str) -> RateLimiter:
+            config = limits.get(name, {})
+            return RateLimiter(name, config.get("rate", 0), config.get("burst", 1))
+
+        self.global_limiter = create("global")  # 所有请求共用一个令牌桶
+        self.group_limiter = create("group")  # 每个群组（私聊为每个用户）一个令牌桶
+        self.command_limiter = create("command")  # 每个命令一个令牌桶（所有群组共用）
+
+    def try_acquire(self, group_id: str, command: str) -> Optional[str]:
+        """
+        尝试获取执行许可
+        Args:
+            group_id: 群组ID（私聊时为用户标识）
+            command: 命令名称
+        Returns:
+            Optional[str]: 放行时返回None，否则返回拒绝请求的限流器名称
+        """
+        return self._try_acquire((
+            (self.global_limiter, None),
+            (self.group_limiter, group_id),
+            (self.command_limiter, command),
+        ))
+
+    def peek(self, group_id: str) -> Optional[str]:
+        """
+        检查全局和群组级是否还有可用令牌，不扣除令牌
+        - 在冷却检查等需要数据库往返的操作之前调用，令牌耗尽时可直接丢弃请求
+        - 有令牌时仍需在之后调用 try_acquire 扣除令牌
+        Args:
+            group_id: 群组ID（私聊时为用户标识）
+        Returns:
+            Optional[str]: 有可用令牌时返回None，否则返回令牌耗尽的限流器名称
+        """
+        now = time.monotonic()
+        for limiter, key in ((self.global_limiter, None), (self.group_limiter, group_id)):
+            bucket = limiter.bucket(key, now)
+            if bucket is not None and bucket.tokens < 1:
+                limiter.rejected += 1
+                return limiter.name
+        return None
+
+    def try_acquire_group(self, group_id: str) -> Optional[str]:
+        """只检查群组级限流（定时任务向各群组投递时使用）"""
+        return self._try_acquire(((self.group_limiter, group_id),))
+
+    def try_acquire_shared(self, command: str) -> Optional[str]:
+        """只检查全局和命令级限流（定时任务为所有群组获取一次内容时使用）"""
+        return self._try_acquire(((self.global_limiter, None), (self.command_limiter, command)))
+
+    def _try_acquire(self, checks: Tuple[Tuple[RateLimiter, Hashable], ...]) -> Optional[str]:
+        now = time.monotonic()
+        buckets: List[TokenBucket] = []
+        for limiter, key in checks:
+            bucket = limiter.bucket(key, now)
+            if bucket is not None and bucket.tokens < 1:
+                limiter.rejected += 1
+                return limiter.name
+            if bucket is not None:
+                buckets.append(bucket)
+
+        for bucket in buckets:
+            bucket.tokens -= 1
+        for limiter, _ in checks:
+            limiter.allowed += 1
+        return None
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取各级限流统计数据"""
+        return {
+            limiter.name: limiter.stats()
+            for limiter in (self.global_limiter, self.group_limiter, self.command_limiter)
+        }
+
+
+# 创建限流实例
+rate_limit = RateLimit(plugin_config.fun_content_rate_limits)
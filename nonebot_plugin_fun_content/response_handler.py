@@ -49,6 +49,18 @@ class ResponseHandler:
             logger.error(f"Unexpected error in {endpoint}: {error}", exc_info=True)
             return f"{base_msg}：发生未知错误"
 
+    @staticmethod
+    def is_hot_list_valid(data: Dict[str, Any]) -> bool:
+        """判断热搜榜数据是否有效（响应成功且包含条目）
+
+        Args:
+            data (Dict[str, Any]): API返回的数据
+
+        Returns:
+            bool: 数据是否有效
+        """
+        return bool((data.get('code') == 200 or data.get('success')) and data.get('data'))
+
     @classmethod
     def process_hot_list(cls, data: Dict[str, Any], endpoint: str) -> str:
         """处理热搜榜数据
@@ -66,15 +78,25 @@ class ResponseHandler:
             "douyin_hot": "抖音热搜",
         }
         display_title = endpoint_to_title.get(endpoint, "热搜")
-        if data.get('code') == 200 or data.get('success'):
-            items = data.get('data', [])
-            if items:
-                return f"当前{display_title}：\n" + "\n".join(
-                    f"{item['index']}. {item['title']} ({item.get('hot', '')})"
-                    for item in items[:10]
-                )
+        if cls.is_hot_list_valid(data):
+            return f"当前{display_title}：\n" + "\n".join(
+                f"{item['index']}. {item['title']} ({item.get('hot', '')})"
+                for item in data['data'][:10]
+            )
         return f"获取{display_title}失败"
 
+    @staticmethod
+    def format_shenhuifu(result: Dict[str, str]) -> str:
+        """将神回复问答格式化为文本
+
+        Args:
+            result (Dict[str, str]): 包含 question 和 answer 的字典
+
+        Returns:
+            str: 问答形式的文本
+        """
+        return f"问：{result['question']}\n答：{result['answer']}"
+
     @staticmethod
     def process_api_text(data: Dict[str, Any], error_msg: str) -> str:
         """处理文本类API响应，将HTML格式转换为纯文本。
@@ -0,0 +1,76 @@
+from itertools import count
+from typing import Dict, List, Set
+
+from nonebot import get_bot, get_bots, logger
+from nonebot.adapters import Bot
+
+
+class BotRouter:
+    """多账号消息路由
+    - 记录每个群组中有哪些已连接的机器人账号，机器人连接时获取其群列表，断开时移除
+    - 向群组发送消息时在该群的机器人之间轮流选择，分摊发送量
+    - 群组不在记录中时（如群列表获取失败）退回到任意已连接的机器人
+    """
+    def __init__(self):
+        self.group_bots: Dict[str, List[str]] = {}  # 群组ID -> 机器人账号列表
+        self.bot_groups: Dict[str, Set[str]] = {}  # 机器人账号 -> 群组ID集合
+        self._counter = count()  # 轮询计数
+
+    async def refresh(self, bot: Bot):
+        """获取机器人的群列表并更新路由（机器人连接时调用）"""
+        try:
+            group_list = await bot.get_group_list()
+        except Exception as e:
+            logger.error(f"Failed to fetch group list for bot {bot.self_id}: {e}")
+            return
+
+        self.remove_bot(bot.self_id)
+        for group in group_list:
+            self.add_group(bot.self_id, str(group["group_id"]))
+        logger.info(f"Bot {bot.self_id} routes {len(group_list)} groups")
+
+    def add_group(self, self_id: str, group_id: str):
+        """记录机器人加入了群组"""
+        groups = self.bot_groups.setdefault(self_id, set())
+        if group_id in groups:
+            return
+        groups.add(group_id)
+        self.group_bots.setdefault(group_id, []).append(self_id)
+
+    def remove_group(self, self_id: str, group_id: str):
+        """记录机器人离开了群组"""
+        groups = self.bot_groups.get(self_id)
+        if not groups or group_id not in groups:
+            return
+        groups.discard(group_id)
+        bots = self.group_bots[group_id]
+        bots.remove(self_id)
+        if not bots:
+            del self.group_bots[group_id]
+
+    def remove_bot(self, self_id: str):
+        """移除机器人的所有路由（机器人断开时调用）"""
+        for group_id in list(self.bot_groups.get(self_id, ())):
+            self.remove_group(self_id, group_id)
+        self.bot_groups.pop(self_id, None)
+
+    def get_bot(self, group_id: str) -> Bot:
+        """选择向群组发送消息的机器人
+        Args:
+            group_id: 群组ID
+        Returns:
+            Bot: 该群中已连接的机器人，多个时轮流选择
+        Raises:
+            ValueError: 没有已连接的机器人时
+        """
+        bots = get_bots()
+        candidates = [bots[self_id] for self_id in self.group_bots.get(str(group_id), ()) if self_id in bots]
+        if not candidates:
+            candidates = list(bots.values())
+        if not candidates:
+            return get_bot()  # 没有已连接的机器人，由 nonebot 抛出异常
+        return candidates[next(self._counter) % len(candidates)]
+
+
+# 创建机器人路由实例
+bot_router = BotRouter()
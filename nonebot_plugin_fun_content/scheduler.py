@@ -1,70 +1,158 @@
-from io import BytesIO
-from typing import Dict, List, Union, Optional, Tuple
+import asyncio
+import random
+import time as time_module
+from datetime import datetime
+from typing import Dict, List, Set, Union, Optional, Tuple
 
-from nonebot import require, get_bot, logger
+from nonebot import require, logger
 from nonebot.adapters.onebot.v11 import MessageSegment, Message
 
 from .api import api
+from .config import plugin_config
+from .database import db_manager
+from .pacing import send_pacer
+from .ratelimit import rate_limit
 from .response_handler import response_handler
+from .router import bot_router
+from .utils import utils
 
 # 导入 nonebot 的调度器
 scheduler = require("nonebot_plugin_apscheduler").scheduler
 
 
 class Scheduler:
+    # 热搜榜轮询任务ID
+    HOT_LIST_POLLER_ID = "fun_content_hot_list_poller"
+    # 预处理内容缓存检查任务ID
+    RENDER_CACHE_REFRESHER_ID = "fun_content_render_cache_refresher"
+    # 运行统计日志任务ID
+    STATS_LOGGER_ID = "fun_content_stats_logger"
+
     def __init__(self):
         """初始化 Scheduler 类
-        - 管理定时任务的添加、删除和执行
-        - 使用字典结构存储任务配置
+        - 管理定时任务的添加、删除和执行，是运行时定时任务的唯一数据来源
+        - 使用集合存储任务配置，重复检查为O(1)
+        - 相同时间、相同命令的所有群组共用一个APScheduler任务
+        - 添加和删除直接写入持久化存储
+        """
+        self.jobs: Dict[str, Dict[str, Set[str]]] = {}  # {group_id: {command: {time1, time2, ...}}}
+        self.slots: Dict[Tuple[str, str], Set[str]] = {}  # {(time, command): {group_id, ...}}
+
+    @staticmethod
+    def _slot_job_id(time: str, command: str) -> str:
+        return f"fun_content_{command}_{time}"
+
+    @staticmethod
+    def normalize_time(time: str) -> Optional[str]:
+        """将 H:MM / HH:MM 格式的时间规范化为 HH:MM，格式错误时返回None
+        - 同一分钟只有一种写法，避免 8:00 和 08:00 被当作两个任务
+        """
+        if not isinstance(time, str) or time.count(':') != 1:
+            return None
+        hour, minute = time.split(':')
+        if not hour.isdigit() or not minute.isdigit():
+            return None
+        hour, minute = int(hour), int(minute)
+        if hour > 23 or minute > 59:
+            return None
+        return f"{hour:02d}:{minute:02d}"
+
+    def _register(self, group_id: str, command: str, time: str) -> bool:
+        """在内存中登记任务，相同时间、相同命令的第一个群组会创建共用的APScheduler任务
+        - time 必须已经过 normalize_time 规范化
+        Returns:
+            bool: 是否为新任务
         """
-        self.jobs: Dict[str, Dict[str, List[str]]] = {}  # {group_id: {command: [time1, time2, ...]}}
+        times = self.jobs.setdefault(group_id, {}).setdefault(command, set())
+        if time in times:
+            return False
+        times.add(time)
+
+        slot = self.slots.get((time, command))
+        if slot is None:
+            hour, minute = map(int, time.split(':'))
+            slot = self.slots[(time, command)] = set()
+            scheduler.add_job(
+                self.run_slot,
+                'cron',
+                id=self._slot_job_id(time, command),
+                hour=hour,
+                minute=minute,
+                args=[time, command],
+                replace_existing=True,
+            )
+        slot.add(group_id)
+        return True
+
+    def load(self, schedules: Dict[str, Dict[str, List[str]]]):
+        """启动时批量登记持久化的定时任务（不会再次写入持久化存储）
+        - 旧版本保存的非规范时间（如 8:00）会改写为规范格式，重复的任务只保留一个
+        Args:
+            schedules: {group_id: {command: [time1, time2, ...]}}
+        """
+        added = 0
+        rewrites = []  # 需要改写的 (群组ID, 命令, 原时间列表, 规范时间列表)
+        for group_id, group_tasks in schedules.items():
+            for command, times in group_tasks.items():
+                normalized_times = []
+                for time in times:
+                    normalized = self.normalize_time(time)
+                    if normalized is None:
+                        logger.error(f"Invalid time format for group {group_id}, command {command}: {time}")
+                        continue
+                    if self._register(str(group_id), command, normalized):
+                        added += 1
+                        normalized_times.append(normalized)
+                if normalized_times != [time for time in times if self.normalize_time(time) is not None]:
+                    rewrites.append((str(group_id), command, list(times), normalized_times))
+
+        # 遍历结束后再修改持久化数据
+        for group_id, command, times, normalized_times in rewrites:
+            self._rewrite_stored_times(group_id, command, times, normalized_times)
+        if rewrites:
+            logger.info(f"Normalized stored schedule times for {len(rewrites)} commands")
+        logger.info(f"Loaded {added} scheduled tasks in {len(self.slots)} time slots")
+
+    @staticmethod
+    def _rewrite_stored_times(group_id: str, command: str, times: List[str], normalized_times: List[str]):
+        """将持久化的时间列表改写为规范且不重复的形式"""
+        for time in times:
+            if time not in normalized_times and Scheduler.normalize_time(time) is not None:
+                utils.remove_scheduled_task(group_id, command, time)
+        stored = utils.get_scheduled_tasks(group_id).get(command, [])
+        for time in normalized_times:
+            while stored.count(time) > 1:  # 只有JSON后端可能保存了完全相同的重复项
+                utils.remove_scheduled_task(group_id, command, time)
+            if time not in stored:
+                utils.add_scheduled_task(group_id, command, time)
+            stored = utils.get_scheduled_tasks(group_id).get(command, [])
 
-    def add_job(self, group_id: str, command: str, time: str):
+    def add_job(self, group_id: str, command: str, time: str) -> bool:
         """添加定时任务
         Args:
             group_id (str): 群组ID
             command (str): 要执行的命令
             time (str): 任务执行时间（格式：HH:MM）
+        Returns:
+            bool: 是否添加了新任务（时间格式错误或任务已存在时返回False）
         """
+        normalized = self.normalize_time(time)
+        if normalized is None:
+            logger.error(f"Invalid time format for group {group_id}, command {command}: {time}")
+            return False
+        time = normalized
+
         try:
-            # 验证时间格式
-            if not isinstance(time, str):
-                logger.error(f"Invalid time format for group {group_id}, command {command}: {time}")
-                return
-
-            hour, minute = time.split(':')
-            if not hour.isdigit() or not minute.isdigit():
-                logger.error(f"Invalid time format for group {group_id}, command {command}: {time}")
-                return
-
-            hour = int(hour)
-            minute = int(minute)
-            if hour < 0 or hour > 23 or minute < 0 or minute > 59:
-                logger.error(f"Invalid time values for group {group_id}, command {command}: {time}")
-                return
-
-            # 更新任务存储并添加到APScheduler
-            if group_id not in self.jobs:
-                self.jobs[group_id] = {}
-            if command not in self.jobs[group_id]:
-                self.jobs[group_id][command] = []
-
-            if time not in self.jobs[group_id][command]:
-                self.jobs[group_id][command].append(time)
-                job_id = f"{group_id}_{command}_{time}"
-                scheduler.add_job(
-                    self.run_scheduled_task,
-                    'cron',
-                    id=job_id,
-                    hour=hour,
-                    minute=minute,
-                    args=[group_id, command]
-                )
-                logger.info(f"Added new task: {command} at {time} for group {group_id}")
-            else:
+            if not self._register(group_id, command, time):
                 logger.info(f"Task already exists: {command} at {time} for group {group_id}")
+                return False
         except Exception as e:
             logger.error(f"Error adding job for group {group_id}, command {command}, time {time}: {str(e)}")
+            return False
+
+        utils.add_scheduled_task(group_id, command, time)
+        logger.info(f"Added new task: {command} at {time} for group {group_id}")
+        return True
 
     def remove_job(self, group_id: str, command: str, time: str) -> bool:
         """移除定时任务
@@ -75,58 +163,149 @@ class Scheduler:
         Returns:
             bool: 如果成功移除返回True，否则返回False
         """
-        if (group_id in self.jobs and 
-            command in self.jobs[group_id] and 
-            time in self.jobs[group_id][command]):
-            self.jobs[group_id][command].remove(time)
-            if not self.jobs[group_id][command]:
-                del self.jobs[group_id][command]
-            if not self.jobs[group_id]:
-                del self.jobs[group_id]
-            job_id = f"{group_id}_{command}_{time}"
-            scheduler.remove_job(job_id)
-            logger.info(f"Removed task: {command} at {time} for group {group_id}")
-            return True
-        logger.info(f"Task not found for removal: {command} at {time} for group {group_id}")
-        return False
+        time = self.normalize_time(time) or time
+        times = self.jobs.get(group_id, {}).get(command)
+        if not times or time not in times:
+            logger.info(f"Task not found for removal: {command} at {time} for group {group_id}")
+            return False
+
+        times.discard(time)
+        if not times:
+            del self.jobs[group_id][command]
+        if not self.jobs[group_id]:
+            del self.jobs[group_id]
+        slot = self.slots.get((time, command))
+        if slot is not None:
+            slot.discard(group_id)
+            if not slot:
+                # 没有群组再使用该时间点的该命令，移除共用的任务
+                del self.slots[(time, command)]
+                scheduler.remove_job(self._slot_job_id(time, command))
+
+        utils.remove_scheduled_task(group_id, command, time)
+        logger.info(f"Removed task: {command} at {time} for group {group_id}")
+        return True
 
     def get_schedule_status(self, group_id: str) -> Dict[str, List[str]]:
         """获取指定群组的定时任务状态
         Args:
             group_id (str): 群组ID
         Returns:
-            Dict[str, List[str]]: 包含该群组所有定时任务的字典
+            Dict[str, List[str]]: 包含该群组所有定时任务的字典，时间按先后排序
         """
-        return self.jobs.get(group_id, {})
+        return {command: sorted(times) for command, times in self.jobs.get(group_id, {}).items()}
+
+    async def run_slot(self, time: str, command: str):
+        """执行同一时间、同一命令下所有群组的定时任务
+        - 内容只获取一次，开启 fun_content_schedule_distinct_content 时为每个群批量获取不同内容
+        - 由固定数量的发送协程依次投递，同时发送的群组数不超过 fun_content_schedule_send_concurrency
+        - 每个群组在 fun_content_schedule_jitter 秒的窗口内随机错开发送时间
+        - 单个群组发送失败不影响其他群组
+        Args:
+            time (str): 任务执行时间
+            command (str): 要执行的命令
+        """
+        triggered_at = time_module.monotonic()
+        group_ids = []
+        for group_id in self.slots.get((time, command), ()):
+            limited_by = rate_limit.try_acquire_group(group_id)
+            if limited_by:
+                logger.warning(f"Scheduled task {command} for group {group_id} dropped by {limited_by} rate limit")
+                continue
+            group_ids.append(group_id)
+        if not group_ids:
+            return
+
+        # 内容只获取一次，全局和命令级限流只计一次
+        limited_by = rate_limit.try_acquire_shared(command)
+        if limited_by:
+            logger.warning(f"Scheduled task {command} at {time} dropped by {limited_by} rate limit")
+            return
 
-    async def run_scheduled_task(self, group_id: str, command: str):
-        """执行定时任务
+        try:
+            results = await self.execute_command_batch(command, len(group_ids))
+        except Exception as e:
+            # 内容获取失败，向所有群组发送错误提示
+            logger.error(f"Error in scheduled task: {e}", exc_info=True)
+            results = [e]
+
+        # 为每个群组随机分配发送时间，按时间先后投递
+        jitter = plugin_config.fun_content_schedule_jitter
+        send_times = sorted(
+            (triggered_at + random.uniform(0, jitter) if jitter > 0 else triggered_at, index, group_id)
+            for index, group_id in enumerate(group_ids)
+        )
+        pending = iter(send_times)
+
+        async def sender():
+            for send_at, index, group_id in pending:
+                await self.run_scheduled_task(
+                    group_id, command, results[index % len(results)],
+                    triggered_at=triggered_at, not_before=send_at,
+                )
+
+        concurrency = max(1, plugin_config.fun_content_schedule_send_concurrency)
+        await asyncio.gather(*(sender() for _ in range(min(concurrency, len(group_ids)))))
+
+    async def run_scheduled_task(self, group_id: str, command: str, result=None,
+                                 triggered_at: Optional[float] = None, not_before: Optional[float] = None):
+        """向一个群组发送定时任务内容
+        - 发送经过全局节流（fun_content_schedule_send_rate / fun_content_schedule_send_max_inflight）
+        - 由消息路由选择该群中的机器人，多个机器人时轮流发送
         Args:
             group_id (str): 群组ID
             command (str): 要执行的命令
+            result: 已获取的内容，为异常时发送错误提示，为None时现场获取
+            triggered_at (float): 任务触发时间（monotonic），用于统计等待时间
+            not_before (float): 最早发送时间（monotonic）
         """
+        if triggered_at is None:
+            triggered_at = time_module.monotonic()
+        if not_before is not None:
+            delay = not_before - time_module.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
         try:
-            bot = get_bot()
-            result = await self.execute_command(command)
+            if isinstance(result, Exception):
+                raise result
+            bot = bot_router.get_bot(group_id)
+            if result is None:
+                result = await self.execute_command(command)
 
             # 处理不同类型的返回结果
-            if isinstance(result, tuple):
-                # 处理返回多个消息的情况
-                for msg in result:
-                    if msg:
+            messages = result if isinstance(result, tuple) else (result,)
+            for msg in messages:
+                if msg:
+                    async with send_pacer.slot(triggered_at):
                         await bot.send_group_msg(group_id=int(group_id), message=msg)
-            elif result:
-                await bot.send_group_msg(group_id=int(group_id), message=result)
 
         except Exception as e:
             error_msg = response_handler.format_error(e, command)
-            logger.error(f"Error in scheduled task: {e}", exc_info=True)
+            logger.error(f"Error in scheduled task for group {group_id}: {e}")
             try:
-                bot = get_bot()
-                await bot.send_group_msg(group_id=int(group_id), message=error_msg)
+                bot = bot_router.get_bot(group_id)
+                async with send_pacer.slot(triggered_at):
+                    await bot.send_group_msg(group_id=int(group_id), message=error_msg)
             except Exception as send_error:
                 logger.error(f"Failed to send error message to group: {send_error}")
 
+    async def execute_command_batch(self, command: str, count: int) -> List[Union[Message, MessageSegment]]:
+        """为多个群组获取定时任务内容
+        Args:
+            command (str): 要执行的命令
+            count (int): 群组数量
+        Returns:
+            List[Union[Message, MessageSegment]]: 内容列表，条数不足count时由调用方循环使用
+        """
+        if not plugin_config.fun_content_schedule_distinct_content or command == "cp":
+            return [await self.execute_command(command)]
+
+        contents = await api.get_contents(command, count)
+        if command == "beauty_pic":
+            return [MessageSegment.image(url) for url in contents]
+        return [Message(content) for content in contents]
+
     async def execute_command(self, command: str) -> Optional[Union[Message, MessageSegment, Tuple[Message, ...], str]]:
         """执行指定的命令
         Args:
@@ -142,8 +321,8 @@ class Scheduler:
 
             elif command == "cp":
                 # CP命令需要默认角色名
-                image_data = await api.get_cp_content("默认CP 默认CP2")
-                return MessageSegment.image(BytesIO(image_data))
+                image = await api.get_cp_content("默认CP 默认CP2")
+                return MessageSegment.image(image)
             else:
                 result = await api.get_content(command)
                 return Message(result)
@@ -152,6 +331,68 @@ class Scheduler:
             logger.error(f"Error executing command {command}: {e}")
             raise
 
+    def start_hot_list_poller(self, interval: int):
+        """启动热搜榜后台轮询
+        - 按固定间隔刷新热搜榜快照，启动后立即执行一次
+        - 开启后热搜命令直接返回最近一次成功的快照，上游缓慢或不可用时返回旧数据
+        Args:
+            interval (int): 轮询间隔（秒）
+        """
+        scheduler.add_job(
+            api.refresh_hot_lists,
+            'interval',
+            id=self.HOT_LIST_POLLER_ID,
+            seconds=interval,
+            next_run_time=datetime.now(scheduler.timezone),  # 使用调度器时区，避免首次轮询被推迟
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True,
+        )
+        api.hot_list_polling = True
+        logger.info(f"Hot list poller started, refreshing every {interval}s")
+
+    def start_render_cache_refresher(self, interval: int):
+        """启动预处理内容缓存的后台检查
+        - 按固定间隔检查内容数据库文件是否变化，变化时在后台重建缓存，请求不会等待
+        Args:
+            interval (int): 检查间隔（秒）
+        """
+        scheduler.add_job(
+            db_manager.refresh_render_cache,
+            'interval',
+            id=self.RENDER_CACHE_REFRESHER_ID,
+            seconds=interval,
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True,
+        )
+        logger.info(f"Render cache refresher started, checking every {interval}s")
+
+    @staticmethod
+    def log_stats():
+        """以debug级别输出连接池、热搜榜缓存、定时发送节流和限流的统计数据"""
+        if not db_manager.memory_store:
+            logger.debug(f"Database pool stats: {db_manager.pool.stats()}")
+        logger.debug(f"Hot list cache stats: {api.hot_list_stats()}")
+        logger.debug(f"Scheduled send pacing stats: {send_pacer.stats()}")
+        logger.debug(f"Rate limit stats: {rate_limit.stats()}")
+
+    def start_stats_logger(self, interval: int):
+        """启动运行统计的定期日志输出
+        Args:
+            interval (int): 输出间隔（秒）
+        """
+        scheduler.add_job(
+            self.log_stats,
+            'interval',
+            id=self.STATS_LOGGER_ID,
+            seconds=interval,
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True,
+        )
+        logger.info(f"Stats logger started, logging every {interval}s")
+
     def clear_all_jobs(self):
         """清除所有定时任务
         - 遍历并删除所有已注册的定时任务
@@ -1,10 +1,10 @@
-import time
 import json
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List
 
 from nonebot import logger
 from .config import plugin_config
+from .persistence import JsonStateStore, SqliteStateStore
 
 
 class Utils:
@@ -14,23 +14,55 @@ class Utils:
 
     def __init__(self):
         """初始化工具类
-        - 管理命令冷却
         - 处理数据持久化
         - 提供功能开关和定时任务管理
         """
-        self.cooldowns: Dict[str, Dict[str, Dict[str, float]]] = {}  # 命令冷却时间记录
         self.persistent_data_file = Path(plugin_config.persistent_data_file)  # 持久化数据文件路径
         self.default_data: Dict[str, Dict[str, Any]] = {  # 默认数据结构
             self.SWITCH_KEY: {},
             self.SCHEDULED_KEY: {}
         }
-        self.persistent_data = self._load_persistent_data()  # 加载持久化数据
+        self.backend = plugin_config.fun_content_persistent_backend  # 持久化后端
+        if self.backend == "sqlite":
+            # SQLite后端按行写入，数据在启动时由 initialize 加载
+            self._store = SqliteStateStore(
+                Path(plugin_config.fun_content_persistent_db_path),
+                lambda: self.persistent_data,
+                self.SWITCH_KEY,
+                self.SCHEDULED_KEY,
+            )
+            self.persistent_data = {self.SWITCH_KEY: {}, self.SCHEDULED_KEY: {}}
+        else:
+            # JSON后端延迟合并写入，短时间内的多次变更只写一次文件
+            self._store = JsonStateStore(
+                self.persistent_data_file,
+                lambda: self.persistent_data,
+                delay=plugin_config.fun_content_persist_delay,
+            )
+            self.persistent_data = self._load_persistent_data()  # 加载持久化数据
+
+    async def initialize(self) -> None:
+        """
+        初始化持久化存储（启动时调用）
+        - SQLite后端：打开数据库，首次使用时从JSON文件迁移数据，然后加载全部数据
+        """
+        if self.backend != "sqlite":
+            return
+        await self._store.open()
+        await self._store.migrate_from_json(self.persistent_data_file)
+        self.persistent_data = await self._store.load()
+        if self._compact_switches(self.persistent_data):
+            self._save_persistent_data()
+        logger.info(f"成功加载持久化数据: {plugin_config.fun_content_persistent_db_path}")
 
     def _ensure_file_exists(self) -> None:
         """确保持久化数据文件存在"""
         if not self.persistent_data_file.exists():
             logger.info(f"创建持久化数据文件: {self.persistent_data_file}")
-            self._save_persistent_data(self.default_data)
+            try:
+                self._store.write_sync(self.default_data)
+            except Exception as e:
+                logger.error(f"保存数据失败: {e}")
 
     def _load_persistent_data(self) -> Dict[str, Any]:
         """
@@ -47,6 +79,9 @@ class Utils:
             # 确保必要的键存在
             data.setdefault(self.SWITCH_KEY, {})
             data.setdefault(self.SCHEDULED_KEY, {})
+            if self._compact_switches(data):
+                # 旧版本为每个群保存了完整的开关表，去掉默认值后重写文件
+                self._store.write_sync(data)
             return data
         except json.JSONDecodeError:
             logger.error(f"JSON解析错误: {self.persistent_data_file}")
@@ -56,29 +91,39 @@ class Utils:
             logger.error(f"加载数据时发生未知错误: {e}")
         return self.default_data  # 出错时返回默认数据
 
-    def _save_persistent_data(self, data: Optional[Dict[str, Any]] = None) -> None:
+    def _save_persistent_data(self) -> None:
         """
-        将数据保存到JSON文件
-        Args:
-            data: 要保存的数据，默认为当前持久化数据
+        保存全部持久化数据
+        - JSON后端：变更在短暂延迟后合并写入，格式化和文件写入不占用事件循环，使用临时文件加重命名原子写入
+        - SQLite后端：用当前数据覆盖数据库内容
         """
-        data_to_save = data if data is not None else self.persistent_data
-        try:
-            self._ensure_directory_exists()  # 确保目录存在
-            # 写入格式化的JSON数据
-            self.persistent_data_file.write_text(
-                json.dumps(data_to_save, indent=2, ensure_ascii=False),
-                encoding='utf-8'
-            )
-            logger.info(f"成功保存持久化数据: {self.persistent_data_file}")
-        except (PermissionError, TypeError, ValueError) as e:
-            logger.error(f"保存数据失败: {e}")
-        except Exception as e:
-            logger.error(f"保存数据时发生未知错误: {e}")
+        self._store.save_all()
+
+    async def flush(self) -> None:
+        """立即写入尚未保存的持久化数据"""
+        await self._store.flush()
 
-    def _ensure_directory_exists(self) -> None:
-        """确保持久化数据文件所在目录存在"""
-        self.persistent_data_file.parent.mkdir(parents=True, exist_ok=True)
+    async def close(self) -> None:
+        """写入尚未保存的数据并关闭存储（关闭时调用）"""
+        await self._store.close()
+
+    def _compact_switches(self, data: Dict[str, Any]) -> bool:
+        """
+        去掉开关数据中的默认值（已启用的命令和空的群组）
+        Args:
+            data: 持久化数据
+        Returns:
+            bool: 是否有数据被移除
+        """
+        switches = data[self.SWITCH_KEY]
+        compacted = {
+            group_id: {cmd: False for cmd, enabled in commands.items() if not enabled}
+            for group_id, commands in switches.items()
+        }
+        compacted = {group_id: commands for group_id, commands in compacted.items() if commands}
+        changed = compacted != switches
+        data[self.SWITCH_KEY] = compacted
+        return changed
 
     def _get_group_sub_data(self, key: str, group_id: str) -> Dict[str, Any]:
         """
@@ -89,15 +134,7 @@ class Utils:
         Returns:
             Dict[str, Any]: 群组数据子项，不存在时初始化
         """
-        if key == self.SWITCH_KEY:
-            # 开关数据默认所有命令都开启
-            self.persistent_data[key].setdefault(
-                group_id, 
-                {cmd: True for cmd in plugin_config.COMMANDS}
-            )
-        else:
-            self.persistent_data[key].setdefault(group_id, {})
-        return self.persistent_data[key][group_id]
+        return self.persistent_data[key].setdefault(group_id, {})
 
     def get_group_config(self, group_id: str) -> Dict[str, Any]:
         """
@@ -108,20 +145,33 @@ class Utils:
             Dict[str, Any]: 包含开关和定时任务的配置
         """
         return {
-            self.SWITCH_KEY: self._get_group_sub_data(self.SWITCH_KEY, group_id),
-            self.SCHEDULED_KEY: self._get_group_sub_data(self.SCHEDULED_KEY, group_id)
+            self.SWITCH_KEY: self.get_switch_status(group_id),
+            self.SCHEDULED_KEY: self.get_scheduled_tasks(group_id)
         }
 
+    def get_switch_status(self, group_id: str) -> Dict[str, bool]:
+        """
+        获取群组所有功能的开关状态
+        Args:
+            group_id: 群组ID
+        Returns:
+            Dict[str, bool]: 命令名称 -> 是否启用
+        """
+        disabled = self.persistent_data[self.SWITCH_KEY].get(group_id, {})
+        return {cmd: cmd not in disabled for cmd in plugin_config.COMMANDS}
+
     def is_function_enabled(self, group_id: str, function: str) -> bool:
         """
         检查功能是否启用
+        - 开关数据只记录被禁用的命令，未记录的群组和命令均为启用
         Args:
             group_id: 群组ID
             function: 功能名称
         Returns:
             bool: 功能是否启用，默认True
         """
-        return self._get_group_sub_data(self.SWITCH_KEY, group_id).get(function, True)
+        disabled = self.persistent_data[self.SWITCH_KEY].get(group_id)
+        return disabled is None or function not in disabled
 
     def disable_function(self, group_id: str, function: str) -> None:
         """
@@ -130,8 +180,11 @@ class Utils:
             group_id: 群组ID
             function: 功能名称
         """
-        self._get_group_sub_data(self.SWITCH_KEY, group_id)[function] = False
-        self._save_persistent_data()  # 保存更改
+        disabled = self._get_group_sub_data(self.SWITCH_KEY, group_id)
+        if function in disabled:
+            return
+        disabled[function] = False
+        self._store.switch_changed(group_id, function, False)  # 保存更改
 
     def enable_function(self, group_id: str, function: str) -> None:
         """
@@ -140,8 +193,14 @@ class Utils:
             group_id: 群组ID
             function: 功能名称
         """
-        self._get_group_sub_data(self.SWITCH_KEY, group_id)[function] = True
-        self._save_persistent_data()  # 保存更改
+        disabled = self.persistent_data[self.SWITCH_KEY].get(group_id)
+        if disabled is None or function not in disabled:
+            return
+        del disabled[function]
+        # 清理空数据结构
+        if not disabled:
+            del self.persistent_data[self.SWITCH_KEY][group_id]
+        self._store.switch_changed(group_id, function, True)  # 保存更改
 
     def get_scheduled_tasks(self, group_id: str) -> Dict[str, List[str]]:
         """
@@ -151,7 +210,7 @@ class Utils:
         Returns:
             Dict[str, List[str]]: 定时任务配置
         """
-        return self._get_group_sub_data(self.SCHEDULED_KEY, group_id)
+        return self.persistent_data[self.SCHEDULED_KEY].get(group_id, {})
 
     def add_scheduled_task(self, group_id: str, command: str, time_str: str) -> None:
         """
@@ -162,7 +221,7 @@ class Utils:
             time_str: 执行时间（HH:MM格式）
         """
         self._get_group_sub_data(self.SCHEDULED_KEY, group_id).setdefault(command, []).append(time_str)
-        self._save_persistent_data()  # 保存更改
+        self._store.schedule_added(group_id, command, time_str)  # 保存更改
 
     def remove_scheduled_task(self, group_id: str, command: str, time_str: str) -> bool:
         """
@@ -182,7 +241,7 @@ class Utils:
                 del self.persistent_data[self.SCHEDULED_KEY][group_id][command]
             if not self.persistent_data[self.SCHEDULED_KEY][group_id]:
                 del self.persistent_data[self.SCHEDULED_KEY][group_id]
-            self._save_persistent_data()  # 保存更改
+            self._store.schedule_removed(group_id, command, time_str)  # 保存更改
             return True
         return False
 
@@ -200,44 +259,6 @@ class Utils:
         except ValueError:
             return False
 
-    def is_in_cooldown(self, command: str, user_id: str, group_id: str) -> bool:
-        """
-        检查命令是否在冷却中
-        Args:
-            command: 命令名称
-            user_id: 用户ID
-            group_id: 群组ID
-        Returns:
-            bool: 是否在冷却中
-        """
-        current_time = time.time()
-        last_use = self.cooldowns.get(command, {}).get(group_id, {}).get(user_id, 0)
-        return current_time < last_use
-
-    def set_cooldown(self, command: str, user_id: str, group_id: str, duration: int) -> None:
-        """
-        设置命令冷却时间
-        Args:
-            command: 命令名称
-            user_id: 用户ID
-            group_id: 群组ID
-            duration: 冷却时长（秒）
-        """
-        self.cooldowns.setdefault(command, {}).setdefault(group_id, {})[user_id] = time.time() + duration
-
-    def get_cooldown_time(self, command: str, user_id: str, group_id: str) -> float:
-        """
-        获取命令剩余冷却时间
-        Args:
-            command: 命令名称
-            user_id: 用户ID
-            group_id: 群组ID
-        Returns:
-            float: 剩余冷却时间（秒）
-        """
-        last_use = self.cooldowns.get(command, {}).get(group_id, {}).get(user_id, 0)
-        return max(0, last_use - time.time())
-
 
 # 创建 Utils 实例
 utils = Utils()
\ No newline at end of file